@@ -0,0 +1,194 @@
+"""
+Connection pool for applications using the asyncio loop type
+(`r.set_loop_type('asyncio')`). Queries run without an explicit connection
+then return awaitables, executed on connections from `pool`.
+
+Requires Python 3.5+
+"""
+
+import asyncio
+from collections import deque
+import time
+
+from rethinkdb import r
+from rethinkdb.errors import ReqlDriverError
+
+from .errors import PoolExhaustedError, QueryTimeoutError
+
+
+class PooledConnection(object):
+    """
+    Async context manager checking a connection out for the block
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.connection = None
+
+    async def __aenter__(self):
+        self.connection = await self.pool.get()
+        return self.connection
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.pool.put(self.connection)
+
+
+class AsyncConnectionPool(object):
+    def __init__(self, max_connections=5, timeout=None, query_timeout=None):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.query_timeout = query_timeout
+        self.connection_factory = r.connect
+        self.connection_kwargs = {}
+        self._idle = deque()
+        # Futures of waiting get() calls; served first come, first served
+        self._waiters = deque()
+        self._created_connections = 0
+
+    def configure(self, max_connections=5, timeout=None, query_timeout=None,
+                  **connection_kwargs):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.query_timeout = query_timeout
+        self.connection_kwargs = connection_kwargs
+
+    async def get(self, timeout=None):
+        """
+        Checks out a connection, waiting up to `timeout` seconds (forever if
+        None) for one to be put back when all of them are in use
+        """
+
+        if timeout is None:
+            timeout = self.timeout
+        started = time.time()
+
+        while True:
+            connection = await self._checkout(timeout, started)
+            if connection is None:
+                break
+            if connection.is_open():
+                return connection
+            self._release_slot()
+
+        try:
+            return await self.connection_factory(**self.connection_kwargs)
+        except BaseException:
+            # Cancelled or failed; either way the slot is not used
+            self._release_slot()
+            raise
+
+    def put(self, connection):
+        if not connection.is_open():
+            self._release_slot()
+            return
+        waiter = self._next_waiter()
+        if waiter is not None:
+            waiter.set_result(connection)
+        else:
+            self._idle.append(connection)
+
+    async def discard(self, connection):
+        try:
+            await connection.close(noreply_wait=False)
+        except Exception:
+            # The connection is most likely broken already
+            pass
+        self._release_slot()
+
+    def connection(self):
+        """
+        Usage: async with pool.connection() as conn: ...
+        """
+
+        return PooledConnection(self)
+
+    async def run(self, query, query_timeout=None, **global_optargs):
+        """
+        Runs a query on a pooled connection. Queries failing due to a broken
+        connection are not re-sent, since writes could be applied twice;
+        closed connections are replaced at checkout, before sending.
+
+        Queries taking longer than `query_timeout` seconds (the pool's
+        `query_timeout` by default) are aborted, raising QueryTimeoutError
+        """
+
+        if query_timeout is None:
+            query_timeout = self.query_timeout
+        connection = await self.get()
+        try:
+            result = await asyncio.wait_for(
+                query.run(connection, **global_optargs), query_timeout)
+        except asyncio.TimeoutError:
+            # The connection is in an unknown state, don't reuse it
+            await self.discard(connection)
+            raise QueryTimeoutError(query_timeout)
+        except ReqlDriverError:
+            await self.discard(connection)
+            raise
+        except BaseException:
+            self.put(connection)
+            raise
+        self.put(connection)
+        return result
+
+    async def close(self):
+        """
+        Closes all idle connections
+        """
+
+        while self._idle:
+            await self.discard(self._idle.pop())
+
+    def created(self):
+        return self._created_connections
+
+    async def _checkout(self, timeout, started):
+        """
+        Returns an idle connection, or None if a slot was reserved for opening
+        a new connection
+        """
+
+        if self._idle:
+            return self._idle.pop()
+        if self._created_connections < self.max_connections:
+            self._created_connections += 1
+            return None
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        remaining = None if timeout is None else max(0, started + timeout - time.time())
+        try:
+            return await asyncio.wait_for(waiter, remaining)
+        except BaseException as error:
+            if waiter.done() and not waiter.cancelled():
+                # Served right before timing out or being cancelled; pass the
+                # connection (or slot) on instead of losing it
+                if waiter.result() is None:
+                    self._release_slot()
+                else:
+                    self.put(waiter.result())
+            if isinstance(error, asyncio.TimeoutError):
+                raise PoolExhaustedError(self.max_connections, time.time() - started)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _next_waiter(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            # Skip waiters which timed out or were cancelled
+            if not waiter.done():
+                return waiter
+        return None
+
+    def _release_slot(self):
+        waiter = self._next_waiter()
+        if waiter is not None:
+            # Let the next waiter open a connection in our place
+            waiter.set_result(None)
+        else:
+            self._created_connections -= 1
+
+
+pool = AsyncConnectionPool()
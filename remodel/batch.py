@@ -0,0 +1,128 @@
+from contextlib import contextmanager
+from threading import local
+
+from rethinkdb import r
+
+from .connection import pools
+
+
+class Deferred(object):
+    """
+    Result of a query added to a batch; available once the batch is sent
+    """
+
+    def __init__(self):
+        self.resolved = False
+        self._value = None
+        self._callbacks = []
+
+    @property
+    def result(self):
+        if not self.resolved:
+            raise RuntimeError('Result is not available until the batch is sent')
+        return self._value
+
+    def resolve(self, value):
+        self._value = value
+        self.resolved = True
+        for callback in self._callbacks:
+            callback(value)
+
+    def then(self, func):
+        """
+        Returns a Deferred resolved with func(<result of this one>)
+        """
+
+        deferred = Deferred()
+        if self.resolved:
+            deferred.resolve(func(self._value))
+        else:
+            self._callbacks.append(lambda value: deferred.resolve(func(value)))
+        return deferred
+
+    def __repr__(self):
+        if not self.resolved:
+            return '<Deferred: pending>'
+        return '<Deferred: %r>' % (self._value,)
+
+
+class Batch(object):
+    def __init__(self):
+        self.queries = []
+
+    def add(self, query, sequence=False, pool='default'):
+        """
+        Adds a query to the batch, returning a Deferred for its result.
+        Sequences (tables, filters, etc.) must be flagged so that they are
+        sent as arrays
+        """
+
+        if sequence:
+            query = query.coerce_to('array')
+        deferred = Deferred()
+        self.queries.append((query, deferred, pool))
+        return deferred
+
+    def send(self):
+        """
+        Runs all queries in a single round trip per pool and resolves their
+        results
+        """
+
+        queries, self.queries = self.queries, []
+        by_pool = {}
+        for query, deferred, pool in queries:
+            by_pool.setdefault(pool, []).append((query, deferred))
+        for pool, pool_queries in by_pool.items():
+            results = pools.get(pool).run(r.expr({str(i): query for i, (query, _)
+                                                  in enumerate(pool_queries)}))
+            for i, (_, deferred) in enumerate(pool_queries):
+                deferred.resolve(results[str(i)])
+
+    def __len__(self):
+        return len(self.queries)
+
+
+_local = local()
+
+
+def current_batch():
+    return getattr(_local, 'batch', None)
+
+
+@contextmanager
+def batch():
+    """
+    Collects the read queries issued by models (e.g. Model.get(),
+    Model.count()) in the block and sends them at its end, as a single query.
+    These return Deferred objects, whose `result` is available after the
+    block. If any of the queries fails, the whole batch fails
+    """
+
+    current = current_batch()
+    if current is not None:
+        # Nested block; queries go to the outer batch
+        yield current
+        return
+
+    current = _local.batch = Batch()
+    try:
+        yield current
+    finally:
+        _local.batch = None
+    current.send()
+
+
+@contextmanager
+def unbatched():
+    """
+    Runs the queries issued in the block right away, even inside a batch()
+    block; for lookups whose result is needed immediately
+    """
+
+    current = current_batch()
+    _local.batch = None
+    try:
+        yield
+    finally:
+        _local.batch = current
@@ -0,0 +1,112 @@
+from itertools import count
+from threading import Lock
+import time
+
+
+class Node(object):
+    # Weight given to the newest sample when averaging latencies
+    latency_weight = 0.3
+
+    def __init__(self, host=None, port=None):
+        self.host = host
+        self.port = port
+        # Connections currently checked out from the pool
+        self.in_flight = 0
+        self.latency = None
+        self.ejected_until = 0
+
+    def record_latency(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.latency_weight * (latency - self.latency)
+
+    def eject(self, duration):
+        self.ejected_until = time.time() + duration
+
+    @property
+    def available(self):
+        return self.ejected_until <= time.time()
+
+    @property
+    def connection_kwargs(self):
+        if self.host is None:
+            # Let the driver pick its defaults
+            return {}
+        kwargs = {'host': self.host}
+        if self.port is not None:
+            kwargs['port'] = self.port
+        return kwargs
+
+    def __repr__(self):
+        return '<Node: %s:%s>' % (self.host, self.port)
+
+
+def parse_host(host):
+    """
+    Accepts 'host', 'host:port' or a (host, port) tuple
+    """
+
+    if isinstance(host, tuple):
+        return Node(*host)
+    if ':' in host:
+        host, port = host.rsplit(':', 1)
+        return Node(host, int(port))
+    return Node(host)
+
+
+class Cluster(object):
+    STRATEGIES = ('round_robin', 'least_in_flight', 'latency')
+
+    def __init__(self, hosts=None, strategy='round_robin', eject_time=30):
+        if strategy not in self.STRATEGIES:
+            raise ValueError('Unknown load balancing strategy "%s" (expected one '
+                             'of %s)' % (strategy, ', '.join(self.STRATEGIES)))
+        self.nodes = [parse_host(host) for host in hosts] if hosts else [Node()]
+        self.strategy = strategy
+        self.eject_time = eject_time
+        self.lock = Lock()
+        self._turn = count()
+
+    def choose(self, nodes=None, exclude=()):
+        """
+        Picks the node to use next, out of `nodes` (all nodes by default).
+        Ejected nodes are only picked if there is nothing else left
+        """
+
+        candidates = [node for node in (nodes or self.nodes) if node not in exclude]
+        if not candidates:
+            return None
+        available = [node for node in candidates if node.available]
+        if not available:
+            return min(candidates, key=lambda node: node.ejected_until)
+
+        if self.strategy == 'least_in_flight':
+            return min(available, key=lambda node: node.in_flight)
+        if self.strategy == 'latency':
+            # Nodes not measured yet are tried first
+            return min(available, key=lambda node: node.latency or 0)
+        return available[next(self._turn) % len(available)]
+
+    def checked_out(self, node):
+        with self.lock:
+            node.in_flight += 1
+
+    def checked_in(self, node):
+        with self.lock:
+            node.in_flight -= 1
+
+    def reset_after_fork(self):
+        """
+        Replaces the lock, which another thread of the parent process may have
+        held while forking, and forgets the parent's checked out connections
+        """
+
+        self.lock = Lock()
+        self._turn = count()
+        for node in self.nodes:
+            node.in_flight = 0
+
+    def eject(self, node):
+        if len(self.nodes) > 1:
+            node.eject(self.eject_time)
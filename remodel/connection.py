@@ -1,12 +1,19 @@
-from rethinkdb import r
+from rethinkdb import ast, r
+from rethinkdb.errors import ReqlDriverError, ReqlTimeoutError
+from collections import deque
 from contextlib import contextmanager
-try:
-    from queue import Queue, Empty
-except ImportError:
-    from Queue import Queue, Empty
+from functools import partial
+import heapq
+from itertools import count
+import os
+import random
+from threading import Condition, Event, Lock, Thread, current_thread, local
+import time
+import weakref
 
-
-from .utils import Counter
+from .cluster import Cluster
+from .errors import AlreadyRegisteredError, PoolExhaustedError, QueryTimeoutError
+from .metrics import PoolStats, to_prometheus
 
 
 class Connection(object):
@@ -37,43 +44,850 @@ class Connection(object):
         return self._conn
 
 
+def uses_asyncio():
+    return r.connection_type.__module__.startswith('rethinkdb.asyncio_net')
+
+
+class Waiter(object):
+    """
+    A thread blocked in ConnectionPool.get(). It is handed either a released
+    connection or, when the pool gave up a slot, None (meaning it may open a
+    new connection itself)
+    """
+
+    def __init__(self):
+        self.event = Event()
+        self.entry = None
+
+    def wake(self, entry=None):
+        self.entry = entry
+        self.event.set()
+
+
+class PinnedConnection(object):
+    """
+    A connection held by a thread across several queries, instead of being
+    checked out and put back for each one of them
+    """
+
+    def __init__(self, pool, connection=None, affine=False):
+        self.pool = pool
+        self.connection = connection
+        self.affine = affine
+        self.pid = os.getpid()
+        # pinned() blocks and stream cursors using the connection; it is
+        # given back once none is left, unless thread-affine
+        self.holders = 0
+        self.released = False
+
+    def acquire(self):
+        self.holders += 1
+
+    def release(self):
+        self.holders -= 1
+        if self.holders <= 0 and not self.affine:
+            self.give_back()
+
+    def give_back(self):
+        connection, self.connection = self.connection, None
+        self.released = True
+        # Pins inherited from the parent process are dropped along with their
+        # thread, after a fork; their connection is not ours to give back
+        if connection is not None and self.pid == os.getpid():
+            self.pool.put(connection)
+
+    def __del__(self):
+        # Thread-affine connections are given back once their thread is gone
+        self.give_back()
+
+
+class Watchdog(object):
+    """
+    Calls back once a deadline passes, from a single thread for all the
+    deadlines of a pool. The thread stops after `linger` seconds without
+    deadlines and is started again when needed
+    """
+
+    linger = 60
+
+    def __init__(self):
+        self._condition = Condition()
+        # [deadline, sequence, callback]; cancelled ones have no callback
+        self._deadlines = []
+        self._sequence = count()
+        self._thread = None
+
+    def watch(self, timeout, callback):
+        entry = [time.time() + timeout, next(self._sequence), callback]
+        with self._condition:
+            heapq.heappush(self._deadlines, entry)
+            if self._thread is None:
+                self._thread = Thread(target=self._watch)
+                self._thread.daemon = True
+                self._thread.start()
+            else:
+                self._condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        with self._condition:
+            entry[2] = None
+            while self._deadlines and self._deadlines[0][2] is None:
+                heapq.heappop(self._deadlines)
+
+    def _watch(self):
+        idle = False
+        while True:
+            with self._condition:
+                while self._deadlines and self._deadlines[0][2] is None:
+                    heapq.heappop(self._deadlines)
+                if not self._deadlines:
+                    if idle:
+                        self._thread = None
+                        return
+                    idle = True
+                    self._condition.wait(self.linger)
+                    continue
+                idle = False
+                remaining = self._deadlines[0][0] - time.time()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                callback = heapq.heappop(self._deadlines)[2]
+            callback()
+
+
+class FeedCursor(object):
+    """
+    Cursor holding a connection of its own (from the pool's feed lane, for
+    changefeeds); the connection is given back once the cursor is closed or
+    exhausted
+    """
+
+    def __init__(self, cursor, release):
+        self.cursor = cursor
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def next(self, wait=True):
+        try:
+            return self.cursor.next(wait)
+        except ReqlTimeoutError:
+            # Nothing new within `wait`; the feed is still open
+            raise
+        except Exception:
+            # Exhausted or errored, the feed is over
+            self.release()
+            raise
+
+    __next__ = next
+
+    def close(self):
+        try:
+            self.cursor.close()
+        finally:
+            self.release()
+
+    def release(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __del__(self):
+        if self._release is None:
+            return
+        # Abandoned while open; stop the query on the server before giving the
+        # connection back, or the next one to use it would get its results
+        try:
+            self.close()
+        except Exception:
+            # The connection was given back all the same
+            pass
+
+
+def is_changefeed(query):
+    # changes() is always chained on the query's first argument
+    while isinstance(query, ast.RqlQuery):
+        if isinstance(query, ast.Changes):
+            return True
+        query = query._args[0] if query._args else None
+    return False
+
+
 class ConnectionPool(object):
-    def __init__(self, max_connections=5):
-        self.q = Queue()
+    def __init__(self, max_connections=5, block=False, timeout=None,
+                 ping_interval=None, retries=1, thread_affinity=False,
+                 min_connections=0, max_idle_time=None, max_lifetime=None,
+                 reap_interval=None, query_timeout=None, max_feed_connections=5):
         self.max_connections = max_connections
-        self._created_connections = Counter()
+        self.min_connections = min_connections
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.reap_interval = reap_interval
+        self.block = block
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.retries = retries
+        self.thread_affinity = thread_affinity
+        self.query_timeout = query_timeout
+        self.max_feed_connections = max_feed_connections
         self.connection_class = Connection
         self.connection_kwargs = {}
+        self.cluster = Cluster()
+        self._feeds = None
+        self._reaper = None
+        self._init_state()
+        self._start_reaper()
+        live_pools.add(self)
 
-    def configure(self, max_connections=5, **connection_kwargs):
+    def configure(self, max_connections=5, block=False, timeout=None,
+                  ping_interval=None, retries=1, thread_affinity=False,
+                  hosts=None, balance='round_robin', eject_time=30,
+                  min_connections=0, max_idle_time=None, max_lifetime=None,
+                  reap_interval=None, query_timeout=None, max_feed_connections=5,
+                  **connection_kwargs):
         self.max_connections = max_connections
+        self.min_connections = min_connections
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.reap_interval = reap_interval
+        self.block = block
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.retries = retries
+        self.thread_affinity = thread_affinity
+        self.query_timeout = query_timeout
+        self.max_feed_connections = max_feed_connections
         self.connection_kwargs = connection_kwargs
+        self.cluster = Cluster(hosts, balance, eject_time)
+        # Open feeds keep their connections; new ones use a new lane
+        self._feeds = None
+        self._start_reaper()
+
+    def get(self, block=None, timeout=None):
+        """
+        Checks out a connection. When all connections are in use, either
+        raises PoolExhaustedError right away or, if blocking, waits up to
+        `timeout` seconds (forever if None) for one to be put back.
+
+        Reused connections are validated first; dead ones are discarded and
+        replaced. New connections are spread over the cluster nodes
+        """
+
+        self._check_pid()
+        self._check_loop_type()
+        if block is None:
+            block = self.block
+        if timeout is None:
+            timeout = self.timeout
+        started = time.time()
+
+        while True:
+            entry = self._checkout(block, timeout, started)
+            if entry is None:
+                break
+            connection, last_used = entry
+            self.cluster.checked_out(self._nodes[connection])
+            if self._is_healthy(connection, last_used):
+                self._stats.observe_checkout(time.time() - started)
+                return connection
+            self.discard(connection)
 
-    def get(self):
         try:
-            return self.q.get_nowait()
-        except Empty:
-            if self._created_connections.current() < self.max_connections:
-                conn = self.connection_class(**self.connection_kwargs).conn
-                self._created_connections.incr()
-                return conn
+            connection = self._connect()
+        except Exception:
+            self._release_slot()
             raise
+        self._stats.observe_checkout(time.time() - started)
+        if self._created_connections < self.min_connections:
+            self._replenish()
+        return connection
 
     def put(self, connection):
-        self.q.put(connection)
-        self._created_connections.decr()
+        if connection not in self._nodes:
+            # Opened before a fork, by the parent process
+            return
+        if not connection.is_open() or self._expired(connection):
+            self.discard(connection)
+            return
+        self.cluster.checked_in(self._nodes[connection])
+        entry = (connection, time.time())
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().wake(entry)
+            else:
+                self._idle.append(entry)
+
+    def discard(self, connection, eject=False):
+        """
+        Closes a checked out connection instead of putting it back, making
+        room for a new one. With `eject`, its node is avoided for a while
+        """
+
+        if connection not in self._nodes:
+            # Opened before a fork; closing it would break the parent's socket
+            return
+        node = self._nodes.pop(connection)
+        del self._opened_at[connection]
+        del self._lifetimes[connection]
+        self.cluster.checked_in(node)
+        if eject:
+            self.cluster.eject(node)
+        try:
+            connection.close(noreply_wait=False)
+        except Exception:
+            # The connection is most likely broken already
+            pass
+        self._stats.incr('closed')
+        self._release_slot()
+        if self._created_connections < self.min_connections:
+            self._replenish()
+
+    def warm(self, connections=None):
+        """
+        Opens connections in parallel, until there are `connections` of them
+        (`min_connections` by default). Raises the first error encountered,
+        if any
+        """
+
+        if connections is None:
+            connections = self.min_connections
+        with self._lock:
+            missing = min(connections, self.max_connections) - self._created_connections
+            # Reserve the slots for the connections about to be opened
+            self._created_connections += max(missing, 0)
+
+        errors = []
+
+        def open_connection():
+            try:
+                connection = self._connect()
+            except Exception as e:
+                errors.append(e)
+                self._release_slot()
+            else:
+                self.put(connection)
+
+        threads = [Thread(target=open_connection) for _ in range(missing)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def reap(self):
+        """
+        Closes connections idle for longer than `max_idle_time`, keeping at
+        least `min_connections` open, and recycles one idle connection older
+        than `max_lifetime`; called periodically by a background thread
+        """
+
+        now = time.time()
+        closed = []
+        with self._lock:
+            if self.max_idle_time is not None:
+                surplus = self._created_connections - self.min_connections
+                # The least recently used connections are at the left
+                while (surplus > 0 and self._idle and
+                       now - self._idle[0][1] >= self.max_idle_time):
+                    closed.append(self._idle.popleft()[0])
+                    surplus -= 1
+            # Recycle old connections one at a time, so that they are not all
+            # reopened at once
+            for entry in self._idle:
+                if self._expired(entry[0]):
+                    self._idle.remove(entry)
+                    closed.append(entry[0])
+                    break
+
+        for connection in closed:
+            self.cluster.checked_out(self._nodes[connection])
+            self.discard(connection)
+        return len(closed)
+
+    @contextmanager
+    def pinned(self):
+        """
+        Holds a single connection for the current thread during the block;
+        queries run meanwhile use it directly, skipping the pool
+        """
+
+        self._check_pid()
+        # Nested blocks, thread affinity and open stream cursors share the
+        # thread's connection
+        pin = self._current_pin()
+        if pin is None:
+            pin = self._local.pin = PinnedConnection(self)
+        if pin.connection is None:
+            pin.connection = self.get()
+        pin.acquire()
+        try:
+            yield pin.connection
+        finally:
+            pin.release()
+
+    def run(self, query, query_timeout=None, **global_optargs):
+        """
+        Runs a query on the thread's pinned connection, or on a pooled one
+        otherwise. If the connection is found closed before the query is
+        sent, another one is tried, up to `retries` times; once sent, queries
+        are never re-sent, since writes could be applied twice.
+
+        Queries taking longer than `query_timeout` seconds (the pool's
+        `query_timeout` by default) are aborted by closing their connection,
+        raising QueryTimeoutError. For cursors, only the first batch is
+        covered.
+
+        Changefeeds are run on connections of their own, from the `feeds`
+        lane; see run_feed()
+        """
+
+        self._check_pid()
+        self._check_loop_type()
+        if is_changefeed(query):
+            return self.run_feed(query, **global_optargs)
+        pin = self._current_pin()
+        if pin is None:
+            if not self.thread_affinity:
+                with self.pinned():
+                    return self.run(query, query_timeout, **global_optargs)
+            pin = self._local.pin = PinnedConnection(self, affine=True)
+
+        if query_timeout is None:
+            query_timeout = self.query_timeout
+        attempt = 0
+        while True:
+            if pin.connection is None:
+                pin.connection = self.get()
+            elif not pin.connection.is_open():
+                # Held connections (pinned or thread-affine) may have broken
+                # since their last query; this one was not sent yet
+                connection, pin.connection = pin.connection, None
+                self.discard(connection, eject=True)
+                if attempt >= self.retries:
+                    raise ReqlDriverError('Connection is closed.')
+                attempt += 1
+                continue
+            try:
+                return self._run_with_timeout(query, pin.connection, query_timeout,
+                                              global_optargs)
+            except QueryTimeoutError:
+                connection, pin.connection = pin.connection, None
+                self.discard(connection)
+                raise
+            except ReqlDriverError:
+                # The query may have reached the server; not retried
+                connection, pin.connection = pin.connection, None
+                self.discard(connection, eject=True)
+                raise
+
+    @property
+    def feeds(self):
+        """
+        Pool of connections dedicated to changefeeds, so that long-lived feeds
+        do not hold connections needed by regular queries. Holds at most
+        `max_feed_connections` connections, one per open feed
+        """
+
+        with self._lock:
+            if self._feeds is None:
+                feeds = ConnectionPool(max_connections=self.max_feed_connections,
+                                       block=self.block, timeout=self.timeout)
+                feeds.connection_class = self.connection_class
+                feeds.connection_kwargs = self.connection_kwargs
+                feeds.cluster = self.cluster
+                self._feeds = feeds
+            return self._feeds
+
+    def run_feed(self, query, **global_optargs):
+        """
+        Runs a changefeed on a connection from the `feeds` lane, held until
+        the returned cursor is closed or exhausted
+        """
+
+        return self.feeds._stream_held(query, None, global_optargs)
+
+    def stream(self, query, query_timeout=None, **global_optargs):
+        """
+        Runs a query on a connection held until the returned cursor is closed
+        or exhausted, so that its batches are fetched on the connection that
+        runs it. Threads holding a pinned connection stream on it instead.
+
+        Meanwhile, the connection is pinned to the thread, so that queries run
+        while iterating (e.g. saving each streamed model) share it instead of
+        needing another one. Changefeeds hold a connection of their own
+        """
+
+        self._check_pid()
+        self._check_loop_type()
+        if self._current_pin() is not None or is_changefeed(query):
+            return self.run(query, query_timeout, **global_optargs)
+
+        pin = self._local.pin = PinnedConnection(self)
+        pin.acquire()
+        try:
+            cursor = self.run(query, query_timeout, **global_optargs)
+        except Exception:
+            pin.release()
+            raise
+        if not hasattr(cursor, 'next'):
+            # Arrays and single values are returned whole
+            pin.release()
+            return cursor
+        return FeedCursor(cursor, pin.release)
+
+    def reset_after_fork(self):
+        """
+        Forgets all connections and counters inherited from the parent
+        process, without closing them. Called automatically in the child
+        process after a fork
+        """
+
+        self._init_state()
+        self.cluster.reset_after_fork()
+        self._reaper = None
+        self._start_reaper()
 
     def created(self):
-        return self._created_connections.current()
+        return self._created_connections
+
+    def stats(self):
+        """
+        Returns connection counts, checkout counters and a histogram of
+        checkout times, in seconds
+        """
+
+        with self._lock:
+            total = self._created_connections
+            idle = len(self._idle)
+            waiting = len(self._waiters)
+        stats = self._stats.as_dict()
+        stats.update(max_connections=self.max_connections, total=total,
+                     in_use=total - idle, idle=idle, waiting=waiting)
+        stats['nodes'] = [{'host': node.host, 'port': node.port,
+                           'in_flight': node.in_flight, 'latency': node.latency,
+                           'available': node.available}
+                          for node in self.cluster.nodes]
+        return stats
+
+    def prometheus(self, prefix='remodel_pool', labels=None):
+        return to_prometheus(self.stats(), prefix, labels)
+
+    def _checkout(self, block, timeout, started):
+        """
+        Returns an idle (connection, last used) entry, or None if a slot was
+        reserved for opening a new connection
+        """
+
+        with self._lock:
+            if self._idle:
+                return self._pop_idle()
+            if self._created_connections < self.max_connections:
+                # Reserve a slot; the connection is opened outside the lock
+                self._created_connections += 1
+                return None
+            if not block:
+                self._stats.incr('exhausted')
+                raise PoolExhaustedError(self.max_connections, 0)
+            waiter = Waiter()
+            self._waiters.append(waiter)
+        self._stats.incr('waits')
+
+        remaining = None if timeout is None else max(0, started + timeout - time.time())
+        if not waiter.event.wait(remaining):
+            with self._lock:
+                # Check again, we might have been woken up in the meantime
+                if not waiter.event.is_set():
+                    self._waiters.remove(waiter)
+                    self._stats.incr('exhausted')
+                    raise PoolExhaustedError(self.max_connections,
+                                             time.time() - started)
+        return waiter.entry
+
+    def _stream_held(self, query, query_timeout, global_optargs):
+        """
+        Runs a query on a connection of its own, held until the returned
+        cursor is closed or exhausted
+        """
+
+        self._check_pid()
+        self._check_loop_type()
+        if query_timeout is None:
+            query_timeout = self.query_timeout
+        connection = self.get()
+        try:
+            cursor = self._run_with_timeout(query, connection, query_timeout,
+                                            global_optargs)
+        except QueryTimeoutError:
+            self.discard(connection)
+            raise
+        except ReqlDriverError:
+            self.discard(connection, eject=True)
+            raise
+        except Exception:
+            self.put(connection)
+            raise
+        if not hasattr(cursor, 'next'):
+            # Arrays and single values are returned whole
+            self.put(connection)
+            return cursor
+        return FeedCursor(cursor, partial(self.put, connection))
+
+    def _run_with_timeout(self, query, connection, timeout, global_optargs):
+        if timeout is None:
+            return query.run(connection, **global_optargs)
+
+        timed_out = []
+
+        def abort():
+            timed_out.append(True)
+            try:
+                # Closing the connection also stops the query on the server
+                connection.close(noreply_wait=False)
+            except Exception:
+                pass
+
+        deadline = self._watchdog.watch(timeout, abort)
+        try:
+            return query.run(connection, **global_optargs)
+        except ReqlDriverError:
+            if timed_out:
+                raise QueryTimeoutError(timeout)
+            raise
+        finally:
+            self._watchdog.cancel(deadline)
+
+    def _init_state(self):
+        self._pid = os.getpid()
+        self._lock = Lock()
+        # Idle connections along with the time they were last put back
+        self._idle = deque()
+        # Blocked get() calls; served first come, first served
+        self._waiters = deque()
+        self._created_connections = 0
+        # Node each open connection was made to, and when
+        self._nodes = {}
+        self._opened_at = {}
+        # Share of max_lifetime each connection lives for, so that
+        # connections opened together do not all expire together
+        self._lifetimes = {}
+        self._local = local()
+        self._stats = PoolStats()
+        self._replenishing = False
+        # Aborts queries past their query_timeout
+        self._watchdog = Watchdog()
+
+    def _current_pin(self):
+        pin = getattr(self._local, 'pin', None)
+        if pin is not None and pin.released:
+            # Given back, possibly from another thread (e.g. by a stream
+            # cursor collected there)
+            pin = self._local.pin = None
+        return pin
+
+    def _check_pid(self):
+        # Catches forks not reported through os.register_at_fork()
+        if self._pid != os.getpid():
+            self.reset_after_fork()
+
+    def _check_loop_type(self):
+        # r.connect() returns futures with the asyncio loop type; see remodel.aio
+        if uses_asyncio():
+            raise RuntimeError('Synchronous connection pools cannot be used with the '
+                               'asyncio loop type; await query.run() instead, which '
+                               'uses remodel.aio.pool')
+
+    def _pop_idle(self):
+        if len(self.cluster.nodes) == 1:
+            return self._idle.pop()
+        # Reuse the most recently used connection to the preferred node
+        node = self.cluster.choose({self._nodes[entry[0]] for entry in self._idle})
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._nodes[self._idle[i][0]] is node:
+                entry = self._idle[i]
+                del self._idle[i]
+                return entry
+
+    def _connect(self):
+        """
+        Opens a connection to the preferred node, failing over to the other
+        ones if it is unreachable
+        """
+
+        tried = []
+        while True:
+            node = self.cluster.choose(exclude=tried)
+            kwargs = dict(self.connection_kwargs, **node.connection_kwargs)
+            started = time.time()
+            try:
+                connection = self.connection_class(**kwargs).conn
+            except ReqlDriverError:
+                self.cluster.eject(node)
+                tried.append(node)
+                if len(tried) == len(self.cluster.nodes):
+                    raise
+                continue
+            node.record_latency(time.time() - started)
+            self._stats.incr('created')
+            self._nodes[connection] = node
+            self._opened_at[connection] = time.time()
+            self._lifetimes[connection] = random.uniform(0.9, 1.0)
+            self.cluster.checked_out(node)
+            return connection
+
+    def _is_healthy(self, connection, last_used):
+        if not connection.is_open():
+            return False
+        if (self.ping_interval is not None and
+                time.time() - last_used >= self.ping_interval):
+            started = time.time()
+            try:
+                connection.server()
+            except ReqlDriverError:
+                return False
+            self._nodes[connection].record_latency(time.time() - started)
+        return True
+
+    def _expired(self, connection):
+        if self.max_lifetime is None:
+            return False
+        lifetime = self.max_lifetime * self._lifetimes[connection]
+        return time.time() - self._opened_at[connection] >= lifetime
+
+    def _start_reaper(self):
+        limits = [limit for limit in (self.max_idle_time, self.max_lifetime)
+                  if limit is not None]
+        if not limits or self._reaper is not None and self._reaper.is_alive():
+            return
+        self._reaper = Thread(target=reap_periodically, args=(weakref.ref(self),))
+        self._reaper.daemon = True
+        self._reaper.start()
+
+    def _replenish(self):
+        """
+        Tops the pool up to `min_connections` in the background
+        """
+
+        with self._lock:
+            if self._replenishing:
+                return
+            self._replenishing = True
+
+        def replenish():
+            try:
+                self.warm()
+            except Exception:
+                # Will be tried again on the next checkout
+                pass
+            finally:
+                self._replenishing = False
+
+        thread = Thread(target=replenish)
+        thread.daemon = True
+        thread.start()
+
+    def _release_slot(self):
+        with self._lock:
+            if self._waiters:
+                # Let the next waiter open a connection in our place
+                self._waiters.popleft().wake()
+            else:
+                self._created_connections -= 1
+
+
+# Pools still in use, reset in the child process after a fork
+live_pools = weakref.WeakSet()
+
+
+def reset_pools_after_fork():
+    for pool in list(live_pools):
+        pool.reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_pools_after_fork)
+
+
+def reap_periodically(pool_ref):
+    """
+    Reaper thread body; only holds a weak reference to the pool so that it
+    stops once the pool is gone or no longer has limits set
+    """
+
+    while True:
+        pool = pool_ref()
+        if pool is None or pool._reaper is not current_thread():
+            return
+        limits = [limit for limit in (pool.max_idle_time, pool.max_lifetime)
+                  if limit is not None]
+        if not limits:
+            pool._reaper = None
+            return
+        interval = pool.reap_interval or max(min(limits) / 2.0, 0.1)
+        pool.reap()
+        del pool
+        time.sleep(interval)
+
+
+class PoolRegistry(object):
+    def __init__(self):
+        self._data = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def register(self, name, pool):
+        if name in self._data:
+            raise AlreadyRegisteredError('Pool "%s" has been already registered' % name)
+        if not isinstance(pool, ConnectionPool):
+            raise ValueError('Registered pool "%r" must be a ConnectionPool' % pool)
+        self._data[name] = pool
+        return pool
+
+    def unregister(self, name):
+        if name not in self._data:
+            raise KeyError('"%s" is not a registered pool' % name)
+        if name == 'default':
+            raise ValueError('The default pool cannot be unregistered')
+        del self._data[name]
+
+    def get(self, name):
+        if name not in self._data:
+            raise KeyError('Pool "%s" has not been registered' % name)
+        return self._data[name]
+
+    def configure(self, name, **kwargs):
+        """
+        Configures the named pool, creating it first if needed
+        """
+
+        if name not in self._data:
+            self.register(name, ConnectionPool())
+        self._data[name].configure(**kwargs)
+        return self._data[name]
+
+    def all(self):
+        return self._data
 
 
-pool = ConnectionPool()
+# Named pools; models are bound to one of them through Model.pool
+pools = PoolRegistry()
+pool = pools.register('default', ConnectionPool())
 
 
 @contextmanager
-def get_conn():
-    conn = pool.get()
-    try:
+def get_conn(name='default'):
+    with pools.get(name).pinned() as conn:
         yield conn
-    finally:
-        pool.put(conn)
@@ -1,6 +1,29 @@
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+
 class OperationError(Exception):
     pass
 
 
 class AlreadyRegisteredError(Exception):
     pass
+
+
+class QueryTimeoutError(Exception):
+    def __init__(self, timeout):
+        self.timeout = timeout
+        super(QueryTimeoutError, self).__init__(
+            'Query did not complete within %.3fs' % timeout)
+
+
+# Subclasses Empty so that code written against the old non-blocking pool,
+# which leaked queue.Empty, keeps working
+class PoolExhaustedError(Empty):
+    def __init__(self, max_connections, waited):
+        self.max_connections = max_connections
+        self.waited = waited
+        super(PoolExhaustedError, self).__init__(
+            'All %d connections are in use (waited %.3fs)' % (max_connections, waited))
@@ -0,0 +1,100 @@
+import operator
+
+from rethinkdb import r
+
+
+class Expression(object):
+    """
+    A value computed by the server from the document being updated, so that
+    updates such as increments are atomic and need no prior fetch
+    """
+
+    def __init__(self, func):
+        self._func = func
+
+    def compile(self, row):
+        return self._func(row)
+
+    def _combine(self, op, other, reverse=False):
+        if reverse:
+            return Expression(lambda row: op(compile_value(other, row), self.compile(row)))
+        return Expression(lambda row: op(self.compile(row), compile_value(other, row)))
+
+    def __add__(self, other):
+        return self._combine(operator.add, other)
+
+    def __radd__(self, other):
+        return self._combine(operator.add, other, reverse=True)
+
+    def __sub__(self, other):
+        return self._combine(operator.sub, other)
+
+    def __rsub__(self, other):
+        return self._combine(operator.sub, other, reverse=True)
+
+    def __mul__(self, other):
+        return self._combine(operator.mul, other)
+
+    def __rmul__(self, other):
+        return self._combine(operator.mul, other, reverse=True)
+
+    def __truediv__(self, other):
+        return self._combine(operator.truediv, other)
+
+    def __rtruediv__(self, other):
+        return self._combine(operator.truediv, other, reverse=True)
+
+    __div__, __rdiv__ = __truediv__, __rtruediv__
+
+    def __getitem__(self, key):
+        return Expression(lambda row: self.compile(row)[key])
+
+    def default(self, value):
+        return Expression(lambda row: self.compile(row).default(value))
+
+    def append(self, value):
+        return self._method('append', value)
+
+    def prepend(self, value):
+        return self._method('prepend', value)
+
+    def set_insert(self, value):
+        return self._method('set_insert', value)
+
+    def set_union(self, values):
+        return self._method('set_union', values)
+
+    def difference(self, values):
+        return self._method('difference', values)
+
+    def _method(self, name, value):
+        return Expression(lambda row: getattr(self.compile(row), name)(
+                          compile_value(value, row)))
+
+
+class F(Expression):
+    """
+    Reference to a field of the document being updated
+    (e.g.: `post.update(views=F('views') + 1)`)
+    """
+
+    def __init__(self, name):
+        self.name = name
+        super(F, self).__init__(lambda row: row[name])
+
+    def __repr__(self):
+        return '<F: %s>' % self.name
+
+
+def compile_value(value, row):
+    if isinstance(value, Expression):
+        return value.compile(row)
+    return value
+
+
+def compile_fields(fields, row=r.row):
+    """
+    Returns the given fields, with expressions compiled against `row`
+    """
+
+    return {field: compile_value(value, row) for field, value in fields.items()}
@@ -1,3 +1,4 @@
+from copy import deepcopy
 from inflection import tableize
 
 from .errors import AlreadyRegisteredError
@@ -7,6 +8,10 @@ from .related import (HasOneDescriptor, BelongsToDescriptor, HasManyDescriptor,
                      HasAndBelongsToManyDescriptor)
 
 
+# Loaded value of fields which did not exist
+missing = object()
+
+
 class FieldHandlerBase(type):
     def __new__(cls, name, bases, dct):
         if not all(isinstance(dct[rel_type], tuple) for rel_type in remodel.models.REL_TYPES):
@@ -68,21 +73,77 @@ class FieldHandlerBase(type):
 
 
 class FieldHandler(object):
+    # Fields not loaded from the database; see ObjectSet.only() and defer()
+    _only = None
+    _deferred = frozenset()
+    # Values, as loaded from (or last saved to) the database, of the fields
+    # changed since; None if not loaded. Recorded when first changed, or read
+    # for lists and objects, since these may be changed in place
+    _loaded = None
+
     def __getattribute__(self, name):
-        if name in super(FieldHandler, self).__getattribute__('restricted'):
+        getattribute = super(FieldHandler, self).__getattribute__
+        if name in getattribute('restricted'):
             raise AttributeError('Cannot access %s: field is restricted' % name)
-        return super(FieldHandler, self).__getattribute__(name)
+        value = getattribute(name)
+        if isinstance(value, (list, dict)) and not name.startswith('_'):
+            getattribute('remember')(name)
+        return value
+
+    def __getattr__(self, name):
+        if self.is_deferred(name):
+            raise AttributeError('Cannot access %s: field is deferred' % name)
+        raise AttributeError(name)
 
     def __setattr__(self, name, value):
         if name in self.restricted:
             raise AttributeError('Cannot set %s: field is restricted' % name)
+        self.remember(name)
         super(FieldHandler, self).__setattr__(name, value)
 
     def __delattr__(self, name):
         if name in self.restricted:
             raise AttributeError('Cannot delete %s: field is restricted' % name)
+        self.remember(name)
         super(FieldHandler, self).__delattr__(name)
 
+    def is_deferred(self, name):
+        if name.startswith('_') or name in self.__dict__:
+            return False
+        if self._only is not None and name not in self._only:
+            return True
+        return name in self._deferred
+
     def as_dict(self):
         return {field: self.__dict__[field] for field in self.__dict__
                 if not field.startswith('_')}
+
+    def changes(self):
+        """
+        Returns the fields set and the fields deleted since the document was
+        loaded, or None if it was not loaded from the database
+        """
+
+        if self._loaded is None:
+            return None
+        changed, removed = {}, []
+        for field, loaded in self._loaded.items():
+            value = self.__dict__.get(field, missing)
+            if value is missing:
+                if loaded is not missing:
+                    removed.append(field)
+            elif loaded is missing or loaded != value:
+                changed[field] = value
+        return changed, removed
+
+    def remember(self, name):
+        """
+        Records the loaded value of a field before it is changed, unless
+        already recorded; fields written directly to __dict__ need calling it
+        """
+
+        loaded = self.__dict__.get('_loaded')
+        if loaded is None or name in loaded or name.startswith('_'):
+            return
+        value = self.__dict__.get(name, missing)
+        loaded[name] = deepcopy(value) if isinstance(value, (list, dict)) else value
@@ -1,13 +1,21 @@
 from rethinkdb import r
 
+from .connection import pools
+from .planner import index_fields, index_name
+from .utils import get_db, get_table
+
 
 def create_tables():
     from .registry import model_registry
 
-    created_tables = r.table_list().run()
+    created_tables = {}
     for model_cls in model_registry.all().values():
-        if model_cls.table_name not in created_tables:
-            result = r.table_create(model_cls.table_name).run()
+        pool, db = pools.get(model_cls.pool), get_db(model_cls)
+        key = (model_cls.pool, model_cls.db)
+        if key not in created_tables:
+            created_tables[key] = pool.run(db.table_list())
+        if model_cls.table_name not in created_tables[key]:
+            result = pool.run(db.table_create(model_cls.table_name))
             if result['tables_created'] != 1:
                 raise RuntimeError('Could not create table %s for model %s' % (
                                    model_cls.table_name, model_cls.__name__))
@@ -16,10 +24,14 @@ def create_tables():
 def drop_tables():
     from .registry import model_registry
 
-    created_tables = r.table_list().run()
+    created_tables = {}
     for model_cls in model_registry.all().values():
-        if model_cls.table_name in created_tables:
-            result = r.table_drop(model_cls.table_name).run()
+        pool, db = pools.get(model_cls.pool), get_db(model_cls)
+        key = (model_cls.pool, model_cls.db)
+        if key not in created_tables:
+            created_tables[key] = pool.run(db.table_list())
+        if model_cls.table_name in created_tables[key]:
+            result = pool.run(db.table_drop(model_cls.table_name))
             if result['tables_dropped'] != 1:
                 raise RuntimeError('Could not drop table %s for model %s' % (
                                    model_cls.table_name, model_cls.__name__))
@@ -30,11 +42,17 @@ def create_indexes():
 
     for model, index_set in index_registry.all().items():
         model_cls = model_registry.get(model)
-        created_indexes = r.table(model_cls.table_name).index_list().run()
+        pool, table = pools.get(model_cls.pool), get_table(model_cls)
+        created_indexes = pool.run(table.index_list())
         for index in index_set:
-            if index not in created_indexes:
-                result = r.table(model_cls.table_name).index_create(index).run()
+            name, fields = index_name(index), index_fields(index)
+            if name not in created_indexes:
+                if len(fields) == 1:
+                    result = pool.run(table.index_create(name))
+                else:
+                    result = pool.run(table.index_create(
+                        name, [r.row[field] for field in fields]))
                 if result['created'] != 1:
                     raise RuntimeError('Could not create index %s for table %s' % (
-                                       index, model_cls.table_name))
-        r.table(model_cls.table_name).index_wait().run()
+                                       name, model_cls.table_name))
+        pool.run(table.index_wait())
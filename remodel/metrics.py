@@ -0,0 +1,105 @@
+from bisect import bisect_left
+from threading import Lock
+
+
+class Histogram(object):
+    # Upper bounds, in seconds
+    buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=None):
+        if buckets is not None:
+            self.buckets = tuple(sorted(buckets))
+        # The last count holds observations above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative[bound] = total
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class PoolStats(object):
+    COUNTERS = ('checkouts', 'waits', 'exhausted', 'created', 'closed')
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.checkout_time = Histogram()
+
+    def incr(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def observe_checkout(self, duration):
+        with self.lock:
+            self.counters['checkouts'] += 1
+            self.checkout_time.observe(duration)
+
+    def as_dict(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['checkout_time'] = self.checkout_time.as_dict()
+        return stats
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('"', '\\"'))
+                             for key, value in sorted(labels.items()))
+
+
+def to_prometheus(stats, prefix='remodel_pool', labels=None):
+    """
+    Renders ConnectionPool.stats() in the Prometheus text exposition format
+    """
+
+    lines = []
+
+    def metric(name, type_, help_, samples):
+        lines.append('# HELP %s_%s %s' % (prefix, name, help_))
+        lines.append('# TYPE %s_%s %s' % (prefix, name, type_))
+        for suffix, sample_labels, value in samples:
+            all_labels = dict(labels or {}, **sample_labels)
+            lines.append('%s_%s%s%s %s' % (prefix, name, suffix,
+                                           format_labels(all_labels), value))
+
+    metric('max_connections', 'gauge', 'Maximum number of connections.',
+           [('', {}, stats['max_connections'])])
+    metric('connections', 'gauge', 'Open connections.',
+           [('', {}, stats['total'])])
+    metric('connections_in_use', 'gauge', 'Connections checked out.',
+           [('', {}, stats['in_use'])])
+    metric('connections_idle', 'gauge', 'Connections waiting to be checked out.',
+           [('', {}, stats['idle'])])
+    metric('waiting', 'gauge', 'Callers waiting for a connection.',
+           [('', {}, stats['waiting'])])
+    metric('node_connections_in_use', 'gauge', 'Connections checked out, per node.',
+           [('', {'node': '%s:%s' % (node['host'], node['port'])}, node['in_flight'])
+            for node in stats['nodes']])
+    for name, help_ in (('checkouts', 'Connections checked out.'),
+                        ('waits', 'Checkouts that had to wait for a connection.'),
+                        ('exhausted', 'Checkouts failed because the pool was exhausted.'),
+                        ('created', 'Connections opened.'),
+                        ('closed', 'Connections closed.')):
+        metric('%s_total' % name, 'counter', help_, [('', {}, stats[name])])
+
+    histogram = stats['checkout_time']
+    samples = [('_bucket', {'le': bound}, count)
+               for bound, count in sorted(histogram['buckets'].items())]
+    samples.append(('_bucket', {'le': '+Inf'}, histogram['count']))
+    samples.append(('_sum', {}, histogram['sum']))
+    samples.append(('_count', {}, histogram['count']))
+    metric('checkout_seconds', 'histogram', 'Time spent checking out a connection.',
+           samples)
+
+    return '\n'.join(lines) + '\n'
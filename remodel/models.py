@@ -4,9 +4,12 @@ from inflection import tableize
 
 from .decorators import callback, dispatch_to_metaclass
 from .errors import OperationError
+from .expressions import Expression, compile_fields
+from .connection import pools
 from .field_handler import FieldHandlerBase, FieldHandler
 from .object_handler import ObjectHandler
-from .registry import model_registry
+from .registry import index_registry, model_registry
+from .utils import get_table, snapshot
 
 
 REL_TYPES = ('has_one', 'has_many', 'belongs_to', 'has_and_belongs_to_many')
@@ -25,6 +28,9 @@ class ModelBase(type):
         # Set metadata
         dct['table_name'] = dct.get('table_name', tableize(name))
 
+        for index in dct.get('indexes', ()):
+            index_registry.register(name, index)
+
         rel_attrs = {rel: dct.setdefault(rel, ()) for rel in REL_TYPES}
         dct['_field_handler_cls'] = FieldHandlerBase(
             '%sFieldHandler' % name,
@@ -56,6 +62,18 @@ class ModelBase(type):
 
 @add_metaclass(ModelBase)
 class Model(object):
+    # Default optargs for every query run on behalf of the model
+    # (e.g.: {'durability': 'soft'})
+    run_options = {}
+    # Name of the connection pool (see remodel.connection.pools) and database
+    # the model's table lives in; the database defaults to the connection's
+    pool = 'default'
+    db = None
+    # Secondary indexes on the model's table, created by create_indexes() and
+    # used for lookups; a tuple of fields declares a compound index
+    # (e.g.: ('email', ('last_name', 'first_name')))
+    indexes = ()
+
     def __init__(self, **kwargs):
         self.fields = self._field_handler_cls()
 
@@ -66,42 +84,87 @@ class Model(object):
         self._run_callbacks('after_init')
 
     def save(self):
+        self._save()
+
+    def _save(self, expressions=None):
         self._run_callbacks('before_save')
 
         fields_dict = self.fields.as_dict()
-        try:
-            # Attempt update
-            id_ = fields_dict['id']
-            result = (r.table(self.table_name).get(id_).replace(r.row
-                        .without(r.row.keys().difference(list(fields_dict.keys())))
-                        .merge(fields_dict), return_changes='always').run())
-
-        except KeyError:
-            # Resort to insert
-            result = (r.table(self.table_name).insert(fields_dict, return_changes=True)
-                      .run())
+        changes = self.fields.changes()
+        if 'id' not in fields_dict:
+            result = self._run(get_table(self).insert(fields_dict,
+                                                      return_changes=True))
+        elif changes is None:
+            # Not loaded from the database; replace the whole document
+            def replace(doc):
+                new_doc = (doc.without(doc.keys().difference(list(fields_dict.keys())))
+                              .merge(fields_dict))
+                if expressions:
+                    # Computed from the stored document, overriding local values
+                    new_doc = new_doc.merge(compile_fields(expressions, doc))
+                return new_doc
+            result = self._run(get_table(self).get(fields_dict['id']).replace(
+                replace, return_changes='always'))
+        else:
+            changed, removed = changes
+            # Objects are replaced instead of merged into the stored ones, and
+            # removed fields are deleted using an empty literal
+            doc = {field: r.literal(value) if isinstance(value, dict) else value
+                   for field, value in changed.items()}
+            doc.update((field, r.literal()) for field in removed)
+            doc.update(compile_fields(expressions or {}))
+            if not doc:
+                # Nothing changed since the document was loaded
+                self._run_callbacks('after_save')
+                return
+            # Expressions' results are only known once the server has run them
+            result = self._run(get_table(self).get(fields_dict['id']).update(
+                doc, return_changes='always' if expressions else False))
+            if result.get('skipped'):
+                raise OperationError('Cannot save %r (document does not exist)' % self)
 
         if result['errors'] > 0:
             raise OperationError(result['first_error'])
 
+        if result.get('changes'):
+            doc = dict(result['changes'][0]['new_val'], _loaded={})
+        else:
+            # Keep the description of partially loaded objects
+            doc = dict(fields_dict, **{key: self.fields.__dict__[key]
+                                       for key in ('_only', '_deferred')
+                                       if key in self.fields.__dict__})
+            doc['_loaded'] = snapshot(fields_dict)
         # Force overwrite so that related caches are flushed
-        self.fields.__dict__ = result['changes'][0]['new_val']
-
+        self.fields.__dict__ = doc
         self._run_callbacks('after_save')
 
     def update(self, **kwargs):
-        for key, value in kwargs.items():
-            # Assign fields this way to be sure that validation takes place
-            setattr(self.fields, key, value)
+        """
+        Sets the given fields and saves the object. Expressions (see
+        remodel.expressions) are computed by the server, in the same query
+        """
 
-        self.save()
+        expressions = {}
+        for key, value in kwargs.items():
+            if isinstance(value, Expression):
+                if key in self.fields.restricted:
+                    raise AttributeError('Cannot set %s: field is restricted' % key)
+                expressions[key] = value
+            else:
+                # Assign fields this way to be sure that validation takes place
+                setattr(self.fields, key, value)
+        if expressions and 'id' not in self.fields.__dict__:
+            raise OperationError('Cannot update %r with expressions (object '
+                                 'not saved)' % self)
+
+        self._save(expressions)
 
     def delete(self):
         self._run_callbacks('before_delete')
 
         try:
             id_ = getattr(self.fields, 'id')
-            result = r.table(self.table_name).get(id_).delete().run()
+            result = self._run(get_table(self).get(id_).delete())
         except AttributeError:
             raise OperationError('Cannot delete %r (object not saved or '
                                  'already deleted)' % self)
@@ -155,6 +218,9 @@ class Model(object):
     def __str__(self):
         return '<%s object>' % self.__class__.__name__
 
+    def _run(self, query):
+        return pools.get(self.pool).run(query, **self.run_options)
+
     def _run_callbacks(self, name):
         for callback in self._callbacks[name]:
             getattr(self, callback)()
@@ -1,6 +1,8 @@
 from rethinkdb import ast
 
 import remodel.connection
+from .connection import uses_asyncio
+from .utils import get_model
 
 
 run = ast.RqlQuery.run
@@ -8,12 +10,27 @@ run = ast.RqlQuery.run
 def remodel_run(self, c=None, **global_optargs):
     """
     Passes a connection from the connection pool so that we can call .run()
-    on a query without an explicit connection
+    on a query without an explicit connection. Queries built on a model's
+    table run on the model's pool, with its `run_options`. With the asyncio
+    loop type, an awaitable is returned instead, from remodel.aio.pool
     """
 
     if not c:
-        with remodel.connection.get_conn() as conn:
-            return run(self, conn, **global_optargs)
+        model_cls = get_model(self)
+        if uses_asyncio():
+            from . import aio
+            if model_cls is not None:
+                if model_cls.pool != 'default':
+                    # remodel.aio has a single pool
+                    raise RuntimeError('Cannot run queries of model %s, bound to pool '
+                                       '"%s", with the asyncio loop type' % (
+                                       model_cls.__name__, model_cls.pool))
+                global_optargs = dict(model_cls.run_options, **global_optargs)
+            return aio.pool.run(self, **global_optargs)
+        if model_cls is not None:
+            return remodel.connection.pools.get(model_cls.pool).run(
+                self, **dict(model_cls.run_options, **global_optargs))
+        return remodel.connection.pool.run(self, **global_optargs)
     else:
         return run(self, c, **global_optargs)
 
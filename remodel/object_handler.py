@@ -1,10 +1,21 @@
+from copy import copy
+
 from rethinkdb import r
+from rethinkdb.errors import ReqlNonExistenceError
+from six import integer_types
+
+from .batch import current_batch, unbatched
+from .connection import pools
+from .errors import OperationError
+from .expressions import compile_fields
+from .planner import Plan, indexable, plan
+from .utils import get_table, snapshot
 
 
 class ObjectHandler(object):
     def __init__(self, model_cls, query=None):
         self.model_cls = model_cls
-        self.query = query or r.table(model_cls.table_name)
+        self.query = query or get_table(model_cls)
 
     def __getattr__(self, name):
         return getattr(self.query, name)
@@ -17,45 +28,113 @@ class ObjectHandler(object):
         obj.save()
         return obj
 
+    def bulk_create(self, objs, batch_size=None):
+        """
+        Inserts the given (unsaved) models with one query per `batch_size`
+        of them (a single one by default), running their save callbacks and
+        setting their generated ids
+        """
+
+        objs = list(objs)
+        for obj in objs:
+            if not isinstance(obj, self.model_cls):
+                raise ValueError('Cannot bulk create %r: not a %s instance' % (
+                                 obj, self.model_cls.__name__))
+        for obj in objs:
+            obj._run_callbacks('before_save')
+
+        batch_size = batch_size or max(len(objs), 1)
+        for start in range(0, len(objs), batch_size):
+            chunk = objs[start:start + batch_size]
+            query = get_table(self.model_cls).insert([obj.fields.as_dict() for obj in chunk])
+            result = self._pool.run(query, **self.model_cls.run_options)
+            if result['errors'] > 0:
+                raise OperationError(result['first_error'])
+            # Keys are generated in order, for documents without an id
+            generated_keys = iter(result.get('generated_keys', []))
+            for obj in chunk:
+                if 'id' not in obj.fields.__dict__:
+                    obj.fields.__dict__['id'] = next(generated_keys)
+                obj.fields.__dict__['_loaded'] = snapshot(obj.fields.as_dict())
+
+        for obj in objs:
+            obj._run_callbacks('after_save')
+        return objs
+
     def get(self, id_=None, **kwargs):
         if id_:
             try:
-                doc = self.query.get(id_).run()
+                query = self.query.get(id_)
             except AttributeError:
                 # self.query has a get_all applied, cannot call get
                 kwargs.update(id=id_)
             else:
-                if doc is not None:
-                    return self._wrap(doc)
-                return None
-        docs = self.query.filter(kwargs).limit(1).run()
-        try:
-            return self._wrap(list(docs)[0])
-        except IndexError:
-            return None
+                return self._run(query, self._wrap_doc)
+        if list(kwargs) == ['id'] and indexable(kwargs['id']):
+            try:
+                query = self.query.get(kwargs['id'])
+            except AttributeError:
+                pass
+            else:
+                return self._run(query, self._wrap_doc)
+        query = plan(self.model_cls, self.query, kwargs).apply(self.query)
+        return self._run(query.limit(1), self._wrap_first, sequence=True)
 
     def get_or_create(self, id_=None, **kwargs):
-        obj = self.get(id_, **kwargs)
+        with unbatched():
+            obj = self.get(id_, **kwargs)
         if obj:
             return obj, False
         return self.create(**kwargs), True
 
     def filter(self, ids=None, **kwargs):
-        if callable(ids):
-            query = self.query.filter(ids).filter(kwargs)
-        elif ids:
+        if ids and not callable(ids):
+            query_plan = Plan('id', ids, kwargs)
             try:
-                query = self.query.get_all(r.args(ids)).filter(kwargs)
+                query = query_plan.apply(self.query)
             except AttributeError:
                 # self.query already has a get_all applied
+                query_plan = Plan(filter=kwargs)
                 query = (self.query.filter(lambda doc: r.expr(ids).contains(doc['id']))
                                    .filter(kwargs))
         else:
-            query = self.query.filter(kwargs)
-        return ObjectSet(self, query)
+            query_plan = plan(self.model_cls, self.query, kwargs)
+            query = query_plan.apply(self.query)
+            if callable(ids):
+                query = query.filter(ids)
+        return ObjectSet(self, query, plan=query_plan)
 
     def count(self):
-        return self.query.count().run()
+        return self._run(self.query.count())
+
+    def _run(self, query, callback=None, sequence=False):
+        """
+        Runs a read query with the model's `run_options` and passes its result
+        through `callback`. Inside a batch() block, the query is deferred (and
+        sent without these options) and a Deferred is returned
+        """
+
+        current = current_batch()
+        if current is not None:
+            deferred = current.add(query, sequence, self.model_cls.pool)
+            return deferred.then(callback) if callback else deferred
+        result = self._pool.run(query, **self.model_cls.run_options)
+        return callback(result) if callback else result
+
+    @property
+    def _pool(self):
+        return pools.get(self.model_cls.pool)
+
+    def _wrap_doc(self, doc):
+        if doc is None:
+            return None
+        return self._wrap(doc)
+
+    def _wrap_first(self, docs):
+        try:
+            return self._wrap(list(docs)[0])
+        except IndexError:
+            return None
 
     def _wrap(self, doc):
         obj = self.model_cls()
@@ -65,31 +144,249 @@ class ObjectHandler(object):
         # Not to call field's __setattr__ function which do validations, we just update dict
         # As validation checks are not issued, this speeds up fetching rows from DB
         obj.fields.__dict__.update(doc)
+        # Loaded values are only recorded once changed; see FieldHandler
+        obj.fields.__dict__['_loaded'] = {}
         return obj
 
 
 class ObjectSet(object):
-    def __init__(self, object_handler, query):
+    def __init__(self, object_handler, query, run_options=None, plan=None):
         self.object_handler = object_handler
         self.query = query
+        self.plan = plan
+        self.run_options = dict(object_handler.model_cls.run_options,
+                                **(run_options or {}))
         self.result_cache = None
+        # Fields left out by only() (all but these) and defer()
+        self.only_fields = None
+        self.deferred_fields = frozenset()
+        # Turns documents into results instead of models; see values()
+        self.row_factory = None
+        # pluck()/without() calls applied when reading, but not writing, the
+        # set's documents
+        self.projections = ()
 
     def __iter__(self):
         self._fetch_results()
         return iter(self.result_cache)
 
     def __len__(self):
-        self._fetch_results()
-        return len(self.result_cache)
+        return self.count()
+
+    def __bool__(self):
+        # Without it, bool() would fall back to __len__ and count the set
+        return self.exists()
+    __nonzero__ = __bool__
 
     def __getitem__(self, key):
+        """
+        Unless the set has been fetched already, slices are run as skip/limit
+        (returning a new, unfetched set) and indices as nth(); negative
+        indices, bounds and steps need fetching the whole set
+        """
+
+        if self.result_cache is None:
+            if isinstance(key, slice):
+                start, stop = key.start or 0, key.stop
+                if key.step in (None, 1) and start >= 0 and (stop is None or stop >= 0):
+                    query = self.query.skip(start) if start else self.query
+                    if stop is not None:
+                        query = query.limit(max(stop - start, 0))
+                    return self._clone(query)
+            elif isinstance(key, integer_types) and key >= 0:
+                try:
+                    doc = self._run(self._projected().nth(key))
+                except ReqlNonExistenceError:
+                    raise IndexError('ObjectSet index out of range')
+                return self._wrap(doc)
         self._fetch_results()
         return self.result_cache[key]
 
-    def iterator(self):
-        results = self.query.run()
-        for doc in results:
-            yield self.object_handler._wrap(doc)
+    def with_options(self, **run_options):
+        """
+        Returns a copy of this set, whose query runs with the given optargs
+        on top of the model's `run_options`
+        """
+
+        clone = self._clone(self.query)
+        clone.run_options = dict(self.run_options, **run_options)
+        return clone
+
+    def only(self, *fields):
+        """
+        Returns a copy of this set loading just the given fields (and the id)
+        of its documents; other fields cannot be accessed on its models
+        """
+
+        fields = set(fields) | {'id'}
+        clone = self._project('pluck', *sorted(fields))
+        if self.only_fields is not None:
+            fields &= self.only_fields
+        clone.only_fields = frozenset(fields)
+        return clone
+
+    def defer(self, *fields):
+        """
+        Returns a copy of this set leaving the given fields of its documents
+        out; they cannot be accessed on its models
+        """
+
+        if 'id' in fields:
+            raise ValueError('Cannot defer the id field')
+        clone = self._project('without', *fields)
+        clone.deferred_fields = self.deferred_fields | frozenset(fields)
+        return clone
+
+    def explain(self):
+        """
+        Returns the index lookup and residual filter chosen for this set,
+        along with the query that is run
+        """
+
+        query_plan = self.plan or Plan()
+        return dict(query_plan.explain(), query=str(self._projected()))
+
+    def values(self, *fields):
+        """
+        Returns a copy of this set yielding plain documents (with just the
+        given fields, if any) instead of models
+        """
+
+        clone = self._project('pluck', *fields) if fields else self._clone(self.query)
+        clone.row_factory = dict
+        return clone
+
+    def values_list(self, *fields, **kwargs):
+        """
+        Returns a copy of this set yielding tuples of the given fields (None
+        for missing ones) instead of models, or the values of a single field
+        with `flat=True`
+        """
+
+        flat = kwargs.pop('flat', False)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments to values_list: %s' %
+                            ', '.join(sorted(kwargs)))
+        if not fields:
+            raise TypeError('values_list() requires at least one field')
+        if flat and len(fields) > 1:
+            raise TypeError('flat is not valid when values_list is called with '
+                            'more than one field')
+
+        clone = self._project('pluck', *fields)
+        if flat:
+            clone.row_factory = lambda doc: doc.get(fields[0])
+        else:
+            clone.row_factory = lambda doc: tuple(doc.get(field) for field in fields)
+        return clone
+
+    def update(self, callbacks=False, **fields):
+        """
+        Sets the given fields (or expressions, see remodel.expressions) on
+        every document in the set with a single query, returning the number
+        of documents changed. With
+        `callbacks=True`, models are fetched and updated one by one instead,
+        running their save callbacks
+        """
+
+        restricted = self.object_handler.model_cls._field_handler_cls.restricted
+        for field in fields:
+            if field in restricted:
+                raise AttributeError('Cannot set %s: field is restricted' % field)
+
+        self.result_cache = None
+        if callbacks:
+            return self._each(lambda obj: obj.update(**fields))
+        return self._write(self.query.update(compile_fields(fields)))['replaced']
+
+    def delete(self, callbacks=False):
+        """
+        Deletes every document in the set with a single query, returning the
+        number of documents deleted. With `callbacks=True`, models are fetched
+        and deleted one by one instead, running their delete callbacks
+        """
+
+        self.result_cache = None
+        if callbacks:
+            return self._each(lambda obj: obj.delete())
+        return self._write(self.query.delete())['deleted']
+
+    def count(self):
+        """
+        Counts the documents in the set, on the server unless the set has
+        been fetched already
+        """
+
+        if self.result_cache is not None:
+            return len(self.result_cache)
+        return self._run(self.query.count())
+
+    def exists(self):
+        if self.result_cache is not None:
+            return bool(self.result_cache)
+        return not self._run(self.query.is_empty())
+
+    def iterator(self, chunk_size=None):
+        """
+        Yields the set's models as the cursor's batches arrive, without
+        caching them; `chunk_size` sets the number of documents per batch
+        """
+
+        run_options = dict(self.run_options)
+        if chunk_size is not None:
+            run_options['max_batch_rows'] = chunk_size
+        cursor = self.object_handler._pool.stream(self._projected(), **run_options)
+        try:
+            for doc in cursor:
+                yield self._wrap(doc)
+        finally:
+            close = getattr(cursor, 'close', None)
+            if close is not None:
+                close()
+
+    def _run(self, query):
+        return self.object_handler._pool.run(query, **self.run_options)
+
+    def _write(self, query):
+        result = self._run(query)
+        if result['errors'] > 0:
+            raise OperationError(result['first_error'])
+        return result
+
+    def _each(self, func):
+        models = self._clone(self.query)
+        models.row_factory = None
+        count = 0
+        # Fetched upfront, so that writes do not interfere with the cursor
+        for obj in list(models.iterator()):
+            func(obj)
+            count += 1
+        return count
+
+    def _project(self, method, *fields):
+        clone = self._clone(self.query)
+        clone.projections = self.projections + ((method, fields),)
+        return clone
+
+    def _projected(self):
+        query = self.query
+        for method, fields in self.projections:
+            query = getattr(query, method)(*fields)
+        return query
+
+    def _clone(self, query):
+        clone = copy(self)
+        clone.query, clone.result_cache = query, None
+        return clone
+
+    def _wrap(self, doc):
+        if self.row_factory is not None:
+            return self.row_factory(doc)
+        obj = self.object_handler._wrap(doc)
+        if self.only_fields is not None or self.deferred_fields:
+            obj.fields._only = self.only_fields
+            obj.fields._deferred = self.deferred_fields
+        return obj
 
     def _fetch_results(self):
         if self.result_cache is None:
@@ -0,0 +1,78 @@
+from rethinkdb import r
+from six import string_types
+
+from .registry import index_registry
+
+
+def index_fields(index):
+    """
+    Returns the fields covered by a simple (field name) or compound (tuple of
+    field names) index
+    """
+
+    return (index,) if isinstance(index, string_types) else tuple(index)
+
+
+def index_name(index):
+    return '_'.join(index_fields(index))
+
+
+def indexable(value):
+    # Null is never indexed, and filtering by an object matches nested fields
+    # partially, unlike an index lookup
+    return value is not None and not isinstance(value, dict)
+
+
+class Plan(object):
+    """
+    How a set of equality predicates is run: a get_all() of `keys` on `index`
+    (if any index covers them), followed by a filter() on the rest
+    """
+
+    def __init__(self, index=None, keys=None, filter=None):
+        self.index = index
+        self.keys = keys
+        self.filter = filter or {}
+
+    def apply(self, query):
+        if self.index is not None:
+            if isinstance(self.keys, list) and len(self.keys) == 1:
+                query = query.get_all(self.keys[0], index=self.index)
+            else:
+                query = query.get_all(r.args(self.keys), index=self.index)
+        if self.filter:
+            query = query.filter(self.filter)
+        return query
+
+    def explain(self):
+        return {'index': self.index, 'keys': self.keys, 'filter': self.filter}
+
+    def __repr__(self):
+        return '<Plan index=%r keys=%r filter=%r>' % (self.index, self.keys, self.filter)
+
+
+def plan(model_cls, query, kwargs):
+    """
+    Picks the index covering most of the fields in `kwargs` (the primary key
+    always wins) and returns the Plan for running `kwargs` on `query`
+    """
+
+    if not hasattr(query, 'get_all'):
+        # query already has a get_all (or any other selection) applied
+        return Plan(filter=dict(kwargs))
+
+    candidates = [index_fields(index)
+                  for index in index_registry.get_for_model(model_cls.__name__) | {'id'}]
+    candidates = [fields for fields in candidates
+                  if all(field in kwargs and indexable(kwargs[field]) for field in fields)]
+    if not candidates:
+        return Plan(filter=dict(kwargs))
+
+    fields = min(candidates, key=lambda fields: (fields != ('id',), -len(fields),
+                                                 index_name(fields)))
+    if len(fields) == 1:
+        key = kwargs[fields[0]]
+    else:
+        key = [kwargs[field] for field in fields]
+    return Plan(index_name(fields), [key],
+                {field: value for field, value in kwargs.items() if field not in fields})
@@ -45,6 +45,15 @@ class IndexRegistry(object):
         self._data = defaultdict(set)
 
     def register(self, model, index):
+        from .planner import index_fields, index_name
+
+        # Compound index names join their fields with underscores, so that
+        # ('last', 'name') would share the name of an index on last_name
+        for other in self._data[model]:
+            if (index_name(other) == index_name(index) and
+                    index_fields(other) != index_fields(index)):
+                raise ValueError('Indexes %r and %r of model "%s" would both be named "%s"' % (
+                                 other, index, model, index_name(index)))
         self._data[model].add(index)
 
     def unregister(self, model, index):
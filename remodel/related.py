@@ -1,9 +1,11 @@
 from rethinkdb import r
 from inflection import tableize
 
+from .batch import unbatched
 from .decorators import cached_property
 from .object_handler import ObjectHandler
 from .registry import model_registry
+from .utils import get_table
 
 
 class RelationDescriptor(object):
@@ -30,7 +32,8 @@ class HasOneDescriptor(RelationDescriptor):
                 rel_obj = None
             else:
                 params = {self.rkey: instance_lkey}
-                rel_obj = self.model_cls.get(**params)
+                with unbatched():
+                    rel_obj = self.model_cls.get(**params)
             # Make related document available on parent (this) e.g.: user.profile
             setattr(instance, self.related_cache, rel_obj)
             return rel_obj
@@ -44,6 +47,7 @@ class HasOneDescriptor(RelationDescriptor):
             rel_obj = getattr(instance, self.related_cache, None)
             if rel_obj is not None:
                 # We are deleting the rkey attr on related field handler, not obj
+                rel_obj.fields.remember(self.rkey)
                 del rel_obj.fields.__dict__[self.rkey]
         else:
             instance_lkey = getattr(instance, self.lkey, None)
@@ -51,6 +55,7 @@ class HasOneDescriptor(RelationDescriptor):
                 raise ValueError('Cannot assign "%r": current instance isn\'t '
                                  'saved' % value)
             # Assign field this way to skip validation
+            value.fields.remember(self.rkey)
             value.fields.__dict__[self.rkey] = instance_lkey
         # Make related document available on parent (this) e.g.: user.profile
         setattr(instance, self.related_cache, value)
@@ -77,7 +82,8 @@ class BelongsToDescriptor(RelationDescriptor):
                 rel_obj = None
             else:
                 params = {self.rkey: instance_lkey}
-                rel_obj = self.model_cls.get(**params)
+                with unbatched():
+                    rel_obj = self.model_cls.get(**params)
             # Make parent document available on related (this) e.g.: profile.user
             setattr(instance, self.related_cache, rel_obj)
             return rel_obj
@@ -89,6 +95,7 @@ class BelongsToDescriptor(RelationDescriptor):
 
         if value is None:
             if self.lkey in instance.__dict__:
+                instance.remember(self.lkey)
                 del instance.__dict__[self.lkey]
         else:
             value_rkey = getattr(value.fields, self.rkey, None)
@@ -96,6 +103,7 @@ class BelongsToDescriptor(RelationDescriptor):
                 raise ValueError('Cannot assign "%r": "%s" instance isn\'t '
                                  'saved' % (value, value.__class__.__name__))
             # Assign field this way to skip validation
+            instance.remember(self.lkey)
             instance.__dict__[self.lkey] = value_rkey
         # Make parent document available on related (this) e.g.: profile.user
         setattr(instance, self.related_cache, value)
@@ -128,6 +136,7 @@ def create_related_object_handler_cls(model_cls, lkey, rkey):
                     raise TypeError('%s instance expected, got %r' %
                                     (model_cls.__name__, obj))
                 # Assign field this way to skip validation
+                obj.fields.remember(rkey)
                 obj.fields.__dict__[rkey] = self._get_parent_lkey()
                 obj.save()
 
@@ -137,11 +146,13 @@ def create_related_object_handler_cls(model_cls, lkey, rkey):
                 obj_key = obj.fields.__dict__.get(rkey, None)
                 if obj_key != ref_key:
                     raise ValueError('%r is not a related object' % obj)
+                obj.fields.remember(rkey)
                 del obj.fields.__dict__[rkey]
                 obj.save()
 
         def clear(self):
             for obj in self.all():
+                obj.fields.remember(rkey)
                 del obj.fields.__dict__[rkey]
                 obj.save()
 
@@ -194,9 +205,9 @@ def create_related_m2m_object_handler_cls(model_cls, lkey, rkey, join_model_cls,
             # Parent field handler instance
             self.parent = parent
             # Returns all docs from model_cls which are referenced in join_model_cls
-            self.query = (r.table(join_model_cls.table_name)
+            self.query = (get_table(join_model_cls)
                           .get_all(self._get_parent_lkey(), index=mlkey)
-                          .eq_join(mrkey, r.table(model_cls.table_name), index=rkey)
+                          .eq_join(mrkey, get_table(model_cls), index=rkey)
                           .map(lambda res: res['right']))
 
         def create(self, **kwargs):
@@ -223,13 +234,15 @@ def create_related_m2m_object_handler_cls(model_cls, lkey, rkey, join_model_cls,
                 new_keys.add(obj_key)
 
             existing_keys = {doc[rkey]
-                            for doc in self.query.run()}
+                            for doc in self._pool.run(self.query,
+                                                      **model_cls.run_options)}
             new_keys -= existing_keys
 
             for obj_key in new_keys:
                 params = {mlkey: self._get_parent_lkey(),
                           mrkey: obj_key}
-                join_model_cls.insert(params).run()
+                join_model_cls.objects._pool.run(join_model_cls.insert(params),
+                                                 **model_cls.run_options)
 
         def remove(self, *objs):
             old_keys = set()
@@ -242,19 +255,22 @@ def create_related_m2m_object_handler_cls(model_cls, lkey, rkey, join_model_cls,
                     old_keys.add(obj_key)
 
             existing_keys = {doc[rkey]
-                            for doc in self.query.run()}
+                            for doc in self._pool.run(self.query,
+                                                      **model_cls.run_options)}
             # Remove inexisting keys from old_keys
             old_keys &= existing_keys
 
             if old_keys:
-                (join_model_cls.get_all(r.args(list(old_keys)), index=mrkey)
-                               .delete()
-                               .run())
+                join_model_cls.objects._pool.run(
+                    join_model_cls.get_all(r.args(list(old_keys)), index=mrkey)
+                                  .delete(),
+                    **model_cls.run_options)
 
         def clear(self):
-            (join_model_cls.get_all(self._get_parent_lkey(), index=mlkey)
-                           .delete()
-                           .run())
+            join_model_cls.objects._pool.run(
+                join_model_cls.get_all(self._get_parent_lkey(), index=mlkey)
+                              .delete(),
+                **model_cls.run_options)
 
         def _get_parent_lkey(self):
             parent_lkey = getattr(self.parent, lkey, None)
@@ -1,5 +1,9 @@
+from copy import deepcopy
 from threading import Lock
 from warnings import warn
+
+from rethinkdb import ast, r
+
 from .decorators import synchronized
 
 
@@ -22,5 +26,53 @@ class Counter(object):
         return self.n
 
 
+def get_db(model_cls):
+    """
+    Returns the database term a model lives in, falling back to `r` (the
+    connection's database) if it doesn't specify one
+    """
+
+    if model_cls.db is None:
+        return r
+    return r.db(model_cls.db)
+
+
+def get_table(model_cls):
+    """
+    Returns the table term of a model (class or instance), which remembers
+    the model so that queries built on it run on the model's pool
+    """
+
+    if not isinstance(model_cls, type):
+        model_cls = type(model_cls)
+    table = get_db(model_cls).table(model_cls.table_name)
+    table._model_cls = model_cls
+    return table
+
+
+def get_model(query):
+    """
+    Returns the model whose table a query is built on, or None
+    """
+
+    # Queries are chained on their first argument, down to the table
+    while isinstance(query, ast.RqlQuery):
+        model_cls = getattr(query, '_model_cls', None)
+        if model_cls is not None:
+            return model_cls
+        query = query._args[0] if query._args else None
+    return None
+
+
+def snapshot(doc):
+    """
+    Copies the lists and objects of a document just saved, which may still be
+    referenced, and changed in place, by the caller; see FieldHandler.changes()
+    """
+
+    return {field: deepcopy(value) for field, value in doc.items()
+            if isinstance(value, (list, dict))}
+
+
 def deprecation_warning(message):
     warn(message, DeprecationWarning, stacklevel=2)
@@ -1,9 +1,10 @@
 import os
+import re
 from rethinkdb import r
 from rethinkdb.errors import RqlDriverError
 import unittest
 
-from remodel.connection import pool, get_conn
+from remodel.connection import ConnectionPool, pool, get_conn
 from remodel.helpers import create_tables
 from remodel.models import Model
 from remodel.registry import model_registry, index_registry
@@ -21,6 +22,25 @@ def get_env_settings():
 pool.configure(max_connections=1, **get_env_settings())
 
 
+class RecordingPool(ConnectionPool):
+    """
+    Records the queries it is given, along with their optargs, and returns
+    `result` instead of running them
+    """
+
+    def __init__(self, result=None):
+        super(RecordingPool, self).__init__()
+        self.result = result
+        self.queries = []
+
+    def run(self, query, **global_optargs):
+        # Variables of implicit functions (r.row) are numbered
+        self.queries.append((re.sub(r'var_\d+', 'var', str(query)), global_optargs))
+        return self.result
+
+    stream = run
+
+
 class BaseTestCase(unittest.TestCase):
     def setUp(self):
         pass
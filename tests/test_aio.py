@@ -0,0 +1,213 @@
+import pytest
+import sys
+
+if sys.version_info < (3, 5):
+    pytest.skip('asyncio support requires Python 3.5+', allow_module_level=True)
+
+import asyncio
+from unittest import mock
+from rethinkdb import r
+from rethinkdb.errors import ReqlDriverError
+
+from remodel.aio import AsyncConnectionPool
+from remodel.connection import ConnectionPool
+from remodel.errors import PoolExhaustedError, QueryTimeoutError
+from remodel.monkey import uses_asyncio
+
+from . import BaseTestCase
+
+
+class FakeAsyncConnection(object):
+    def __init__(self, loop):
+        self.loop = loop
+        self.open = True
+
+    def is_open(self):
+        return self.open
+
+    def close(self, noreply_wait=True):
+        self.open = False
+        return done(self.loop)
+
+
+def done(loop, result=None, exception=None):
+    future = loop.create_future()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return future
+
+
+class FakeQuery(object):
+    def __init__(self, loop, failures=0):
+        self.loop = loop
+        self.failures = failures
+        self.connections = []
+
+    def run(self, c=None, **global_optargs):
+        self.connections.append(c)
+        if len(self.connections) <= self.failures:
+            return done(self.loop, exception=ReqlDriverError('Connection is closed.'))
+        return done(self.loop, global_optargs)
+
+
+class AsyncPoolTestCase(BaseTestCase):
+    def setUp(self):
+        super(AsyncPoolTestCase, self).setUp()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        super(AsyncPoolTestCase, self).tearDown()
+        self.loop.close()
+
+    def make_pool(self, **kwargs):
+        pool = AsyncConnectionPool()
+        pool.configure(**kwargs)
+        pool.connection_factory = lambda **kwargs: done(
+            self.loop, FakeAsyncConnection(self.loop))
+        return pool
+
+    def run_until_complete(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+
+class GetTests(AsyncPoolTestCase):
+    def test_creates_connection(self):
+        pool = self.make_pool()
+        assert self.run_until_complete(pool.get()).is_open()
+        assert pool.created() == 1
+
+    def test_reuses_released_connection(self):
+        pool = self.make_pool(max_connections=1)
+        conn = self.run_until_complete(pool.get())
+        pool.put(conn)
+        assert self.run_until_complete(pool.get()) is conn
+
+    def test_closed_connection_replaced(self):
+        pool = self.make_pool(max_connections=1)
+        conn = self.run_until_complete(pool.get())
+        pool.put(conn)
+        conn.open = False
+        assert self.run_until_complete(pool.get()) is not conn
+        assert pool.created() == 1
+
+    def test_timeout(self):
+        pool = self.make_pool(max_connections=1, timeout=0.01)
+        self.run_until_complete(pool.get())
+        with pytest.raises(PoolExhaustedError):
+            self.run_until_complete(pool.get())
+        assert len(pool._waiters) == 0
+
+    def test_waiters_served_in_order(self):
+        pool = self.make_pool(max_connections=1, timeout=1)
+        conn = self.run_until_complete(pool.get())
+        served = []
+
+        def checkout(name):
+            future = asyncio.ensure_future(pool.get(), loop=self.loop)
+            future.add_done_callback(lambda f: (served.append(name), pool.put(f.result())))
+            return future
+
+        futures = [checkout(name) for name in range(3)]
+        # Let all of them start waiting
+        self.run_until_complete(asyncio.sleep(0.01))
+        pool.put(conn)
+        self.run_until_complete(asyncio.gather(*futures))
+        assert served == [0, 1, 2]
+
+
+    def cancelled_once_served(self, pool):
+        # Cancellation arriving after put() or _release_slot() served the
+        # waiter, which some Python versions' wait_for() report as cancelled
+        async def wait_for(waiter, timeout):
+            await waiter
+            raise asyncio.CancelledError()
+
+        with mock.patch('asyncio.wait_for', wait_for):
+            future = asyncio.ensure_future(pool.get(), loop=self.loop)
+            self.run_until_complete(asyncio.sleep(0.01))
+        return future
+
+    def test_cancelled_after_served(self):
+        pool = self.make_pool(max_connections=1, timeout=0.05)
+        conn = self.run_until_complete(pool.get())
+        future = self.cancelled_once_served(pool)
+        pool.put(conn)
+        with pytest.raises(asyncio.CancelledError):
+            self.run_until_complete(future)
+        assert self.run_until_complete(pool.get()) is conn
+
+    def test_cancelled_after_given_slot(self):
+        pool = self.make_pool(max_connections=1, timeout=0.05)
+        self.run_until_complete(pool.get())
+        future = self.cancelled_once_served(pool)
+        pool._release_slot()
+        with pytest.raises(asyncio.CancelledError):
+            self.run_until_complete(future)
+        assert pool.created() == 0
+
+class RunTests(AsyncPoolTestCase):
+    def test_returns_result(self):
+        pool = self.make_pool()
+        query = FakeQuery(self.loop)
+        assert self.run_until_complete(pool.run(query, durability='soft')) == {'durability': 'soft'}
+        assert len(pool._idle) == 1
+
+    def test_sent_query_not_retried(self):
+        pool = self.make_pool()
+        query = FakeQuery(self.loop, failures=1)
+        with pytest.raises(ReqlDriverError):
+            self.run_until_complete(pool.run(query))
+        assert len(query.connections) == 1
+        assert pool.created() == 0
+        self.run_until_complete(pool.run(query))
+        assert query.connections[0] is not query.connections[1]
+
+    def test_timeout(self):
+        pool = self.make_pool(query_timeout=0.01)
+        query = FakeQuery(self.loop)
+        query.run = lambda c=None, **kwargs: asyncio.sleep(1)
+        with pytest.raises(QueryTimeoutError):
+            self.run_until_complete(pool.run(query))
+        assert pool.created() == 0
+
+
+class ConnectionTests(AsyncPoolTestCase):
+    def test_context_manager(self):
+        pool = self.make_pool()
+        manager = pool.connection()
+        conn = self.run_until_complete(manager.__aenter__())
+        assert len(pool._idle) == 0
+        self.run_until_complete(manager.__aexit__(None, None, None))
+        assert pool._idle[0] is conn
+
+    def test_close(self):
+        pool = self.make_pool()
+        conn = self.run_until_complete(pool.get())
+        pool.put(conn)
+        self.run_until_complete(pool.close())
+        assert not conn.is_open()
+        assert pool.created() == 0
+
+
+class LoopTypeTests(BaseTestCase):
+    def tearDown(self):
+        super(LoopTypeTests, self).tearDown()
+        r.set_loop_type(None)
+
+    def test_default(self):
+        assert not uses_asyncio()
+
+    def test_asyncio(self):
+        r.set_loop_type('asyncio')
+        assert uses_asyncio()
+
+    def test_sync_pool_refused(self):
+        pool = ConnectionPool()
+        r.set_loop_type('asyncio')
+        with pytest.raises(RuntimeError):
+            pool.get()
+        with pytest.raises(RuntimeError):
+            pool.run(r.expr(1))
+        assert pool.created() == 0
@@ -0,0 +1,148 @@
+import pytest
+
+from remodel.batch import Batch, Deferred, batch, current_batch, unbatched
+from remodel.connection import ConnectionPool, pools
+from remodel.helpers import create_tables, create_indexes
+from remodel.models import Model
+from rethinkdb import r
+
+from . import BaseTestCase, DbBaseTestCase
+
+
+class DeferredTests(BaseTestCase):
+    def test_pending(self):
+        with pytest.raises(RuntimeError):
+            Deferred().result
+
+    def test_resolve(self):
+        deferred = Deferred()
+        deferred.resolve(1)
+        assert deferred.resolved
+        assert deferred.result == 1
+
+    def test_then_pending(self):
+        deferred = Deferred()
+        chained = deferred.then(lambda value: value + 1)
+        assert not chained.resolved
+        deferred.resolve(1)
+        assert chained.result == 2
+
+    def test_then_resolved(self):
+        deferred = Deferred()
+        deferred.resolve(1)
+        assert deferred.then(lambda value: value + 1).result == 2
+
+
+class BatchTests(BaseTestCase):
+    def test_add(self):
+        b = Batch()
+        deferred = b.add(r.expr(1))
+        assert isinstance(deferred, Deferred)
+        assert len(b) == 1
+
+    def test_send_empty(self):
+        # Must not run any query
+        Batch().send()
+
+    def test_current_batch(self):
+        assert current_batch() is None
+        with batch() as b:
+            assert current_batch() is b
+        assert current_batch() is None
+
+    def test_nested(self):
+        with batch() as b:
+            with batch() as nested_b:
+                assert nested_b is b
+
+    def test_not_sent_on_error(self):
+        with pytest.raises(ValueError):
+            with batch() as b:
+                b.add(r.expr(1))
+                raise ValueError()
+        assert current_batch() is None
+
+
+class UnbatchedTests(BaseTestCase):
+    def test_suspends_batch(self):
+        with batch() as b:
+            with unbatched():
+                assert current_batch() is None
+            assert current_batch() is b
+
+    def test_outside_batch(self):
+        with unbatched():
+            assert current_batch() is None
+
+
+class StubPool(ConnectionPool):
+    def run(self, query, **global_optargs):
+        query = str(query)
+        if '.insert(' in query:
+            return {'errors': 0, 'changes': [{'new_val': {'id': 2, 'name': 'Andrei'}}]}
+        if '.limit(' in query:
+            return []
+        return {'id': 1, 'name': 'Bob'}
+
+
+class LookupTests(BaseTestCase):
+    def setUp(self):
+        super(LookupTests, self).setUp()
+        pools.register('stub', StubPool())
+
+        class Artist(Model):
+            pool = 'stub'
+
+        class Song(Model):
+            pool = 'stub'
+            belongs_to = ('Artist',)
+        self.Artist, self.Song = Artist, Song
+
+    def tearDown(self):
+        super(LookupTests, self).tearDown()
+        pools.unregister('stub')
+
+    def test_get_or_create(self):
+        with batch():
+            artist, created = self.Artist.get_or_create(name='Andrei')
+        assert created
+        assert isinstance(artist, self.Artist)
+        assert artist['id'] == 2
+
+    def test_related_object_not_deferred(self):
+        song = self.Song.objects._wrap({'id': 1, 'artist_id': 1})
+        with batch():
+            artist = song['artist']
+        assert isinstance(artist, self.Artist)
+        assert song['artist'] is artist
+
+
+class BatchQueryTests(DbBaseTestCase):
+    def setUp(self):
+        super(BatchQueryTests, self).setUp()
+
+        class Artist(Model):
+            pass
+        self.Artist = Artist
+
+        create_tables()
+        create_indexes()
+
+    def test_results_deferred(self):
+        a = self.Artist.create(name='Andrei')
+        with batch():
+            by_id = self.Artist.get(a['id'])
+            by_kwargs = self.Artist.get(name='Andrei')
+            inexistent = self.Artist.get(name='inexistent')
+            count = self.Artist.count()
+            assert not count.resolved
+        assert by_id.result['id'] == a['id']
+        assert by_kwargs.result['id'] == a['id']
+        assert inexistent.result is None
+        assert count.result == 1
+
+    def test_raw_query(self):
+        self.Artist.create()
+        with batch() as b:
+            docs = b.add(r.table(self.Artist.table_name), sequence=True)
+        assert len(docs.result) == 1
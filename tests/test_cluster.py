@@ -0,0 +1,116 @@
+import pytest
+
+from remodel.cluster import Cluster, Node, parse_host
+
+from . import BaseTestCase
+
+
+class ParseHostTests(BaseTestCase):
+    def test_host(self):
+        node = parse_host('db1')
+        assert (node.host, node.port) == ('db1', None)
+
+    def test_host_and_port(self):
+        node = parse_host('db1:28016')
+        assert (node.host, node.port) == ('db1', 28016)
+
+    def test_tuple(self):
+        node = parse_host(('db1', 28016))
+        assert (node.host, node.port) == ('db1', 28016)
+
+
+class NodeTests(BaseTestCase):
+    def test_first_latency(self):
+        node = Node('db1')
+        node.record_latency(0.1)
+        assert node.latency == 0.1
+
+    def test_latency_averaged(self):
+        node = Node('db1')
+        node.record_latency(0.1)
+        node.record_latency(0.2)
+        assert 0.1 < node.latency < 0.2
+
+    def test_ejected(self):
+        node = Node('db1')
+        node.eject(30)
+        assert not node.available
+
+    def test_ejection_expires(self):
+        node = Node('db1')
+        node.eject(0)
+        assert node.available
+
+    def test_default_connection_kwargs(self):
+        assert Node().connection_kwargs == {}
+
+    def test_connection_kwargs(self):
+        assert Node('db1', 28016).connection_kwargs == {'host': 'db1', 'port': 28016}
+
+
+class ClusterTests(BaseTestCase):
+    def test_single_default_node(self):
+        cluster = Cluster()
+        assert len(cluster.nodes) == 1
+        assert cluster.nodes[0].host is None
+
+    def test_unknown_strategy(self):
+        with pytest.raises(ValueError):
+            Cluster(['db1'], strategy='random')
+
+    def test_round_robin(self):
+        cluster = Cluster(['db1', 'db2'])
+        hosts = [cluster.choose().host for _ in range(4)]
+        assert hosts == ['db1', 'db2', 'db1', 'db2']
+
+    def test_least_in_flight(self):
+        cluster = Cluster(['db1', 'db2'], strategy='least_in_flight')
+        cluster.checked_out(cluster.nodes[0])
+        assert cluster.choose() is cluster.nodes[1]
+        cluster.checked_out(cluster.nodes[1])
+        cluster.checked_out(cluster.nodes[1])
+        assert cluster.choose() is cluster.nodes[0]
+
+    def test_latency(self):
+        cluster = Cluster(['db1', 'db2'], strategy='latency')
+        cluster.nodes[0].record_latency(0.2)
+        cluster.nodes[1].record_latency(0.1)
+        assert cluster.choose() is cluster.nodes[1]
+
+    def test_latency_unmeasured_first(self):
+        cluster = Cluster(['db1', 'db2'], strategy='latency')
+        cluster.nodes[0].record_latency(0.1)
+        assert cluster.choose() is cluster.nodes[1]
+
+    def test_ejected_node_skipped(self):
+        cluster = Cluster(['db1', 'db2'])
+        cluster.eject(cluster.nodes[0])
+        assert all(cluster.choose() is cluster.nodes[1] for _ in range(4))
+
+    def test_all_ejected(self):
+        cluster = Cluster(['db1', 'db2'])
+        cluster.eject(cluster.nodes[0])
+        cluster.eject(cluster.nodes[1])
+        # The node coming back the soonest is used
+        assert cluster.choose() is cluster.nodes[0]
+
+    def test_single_node_never_ejected(self):
+        cluster = Cluster(['db1'])
+        cluster.eject(cluster.nodes[0])
+        assert cluster.nodes[0].available
+
+    def test_exclude(self):
+        cluster = Cluster(['db1', 'db2'])
+        assert cluster.choose(exclude=[cluster.nodes[0]]) is cluster.nodes[1]
+        assert cluster.choose(exclude=cluster.nodes) is None
+
+    def test_reset_after_fork(self):
+        cluster = Cluster(['db1', 'db2'])
+        cluster.checked_out(cluster.nodes[0])
+        # As if another thread of the parent held it while forking
+        cluster.lock.acquire()
+        cluster.reset_after_fork()
+        assert not cluster.lock.locked()
+        assert cluster.nodes[0].in_flight == 0
+        cluster.checked_out(cluster.nodes[1])
+        assert cluster.nodes[1].in_flight == 1
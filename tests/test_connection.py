@@ -0,0 +1,985 @@
+import gc
+import os
+import pytest
+from rethinkdb import r
+from rethinkdb.errors import ReqlDriverError, ReqlRuntimeError
+from threading import Thread
+import time
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+from remodel.connection import (ConnectionPool, FeedCursor, PoolRegistry,
+                                is_changefeed, live_pools, pool, pools,
+                                reset_pools_after_fork)
+from remodel.errors import AlreadyRegisteredError, PoolExhaustedError, QueryTimeoutError
+
+from . import BaseTestCase
+
+
+class FakeRawConnection(object):
+    def __init__(self):
+        self.open = True
+        self.reachable = True
+        self.pings = 0
+
+    def is_open(self):
+        return self.open
+
+    def close(self, noreply_wait=True):
+        self.open = False
+
+    def server(self):
+        self.pings += 1
+        if not self.reachable:
+            raise ReqlDriverError('Connection is closed.')
+        return {}
+
+
+class FakeConnection(object):
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.conn = FakeRawConnection()
+
+
+class FakeQuery(object):
+    """Fails with a driver error the first `failures` times it is run"""
+
+    def __init__(self, failures=0, error=ReqlDriverError):
+        self.failures = failures
+        self.error = error
+        self.connections = []
+
+    def run(self, c=None, **global_optargs):
+        self.connections.append(c)
+        if len(self.connections) <= self.failures:
+            raise self.error('Connection is closed.')
+        return global_optargs
+
+
+class FailingConnection(object):
+    def __init__(self, **kwargs):
+        pass
+
+    @property
+    def conn(self):
+        raise RuntimeError('Could not connect')
+
+
+class SlowQuery(object):
+    """Takes `duration` seconds, unless its connection is closed meanwhile"""
+
+    def __init__(self, duration):
+        self.duration = duration
+
+    def run(self, c=None, **global_optargs):
+        deadline = time.time() + self.duration
+        while time.time() < deadline:
+            if not c.is_open():
+                raise ReqlDriverError('Connection is closed.')
+            time.sleep(0.005)
+        return 'done'
+
+
+def make_pool(connection_class=FakeConnection, **kwargs):
+    pool = ConnectionPool()
+    pool.configure(**kwargs)
+    pool.connection_class = connection_class
+    return pool
+
+
+class GetTests(BaseTestCase):
+    def test_creates_connection(self):
+        pool = make_pool(max_connections=1)
+        assert pool.get() is not None
+        assert pool.created() == 1
+
+    def test_reuses_released_connection(self):
+        pool = make_pool(max_connections=1)
+        conn = pool.get()
+        pool.put(conn)
+        assert pool.get() is conn
+        assert pool.created() == 1
+
+    def test_passes_connection_kwargs(self):
+        created = []
+
+        def connection_class(**kwargs):
+            created.append(FakeConnection(**kwargs))
+            return created[-1]
+
+        pool = make_pool(connection_class, host='localhost', port=28015)
+        pool.get()
+        assert created[0].kwargs == {'host': 'localhost', 'port': 28015}
+
+    def test_non_blocking_exhausted(self):
+        pool = make_pool(max_connections=1)
+        pool.get()
+        with pytest.raises(PoolExhaustedError):
+            pool.get()
+
+    def test_exhausted_is_queue_empty(self):
+        pool = make_pool(max_connections=1)
+        pool.get()
+        with pytest.raises(Empty):
+            pool.get()
+
+    def test_blocking_timeout(self):
+        pool = make_pool(max_connections=1, block=True, timeout=0.05)
+        pool.get()
+        with pytest.raises(PoolExhaustedError) as excinfo:
+            pool.get()
+        assert excinfo.value.waited >= 0.05
+        assert excinfo.value.max_connections == 1
+
+    def test_blocking_gets_released_connection(self):
+        pool = make_pool(max_connections=1, block=True, timeout=1)
+        conn = pool.get()
+        Thread(target=lambda: (time.sleep(0.05), pool.put(conn))).start()
+        assert pool.get() is conn
+
+    def test_blocking_waiters_served_in_order(self):
+        pool = make_pool(max_connections=1, block=True, timeout=1)
+        conn = pool.get()
+        served = []
+
+        def checkout(name):
+            c = pool.get()
+            served.append(name)
+            pool.put(c)
+
+        threads = []
+        for name in range(3):
+            thread = Thread(target=checkout, args=(name,))
+            thread.start()
+            threads.append(thread)
+            # Make sure threads start waiting in a known order
+            time.sleep(0.02)
+        pool.put(conn)
+        for thread in threads:
+            thread.join()
+        assert served == [0, 1, 2]
+
+    def test_failed_connect_releases_slot(self):
+        pool = make_pool(FailingConnection, max_connections=1)
+        with pytest.raises(RuntimeError):
+            pool.get()
+        assert pool.created() == 0
+
+    def test_released_slot_handed_to_waiter(self):
+        pool = make_pool(max_connections=1, block=True, timeout=1)
+        pool.get()
+        results = []
+        thread = Thread(target=lambda: results.append(pool.get()))
+        thread.start()
+        time.sleep(0.02)
+        # Give up the slot instead of returning the connection
+        pool._release_slot()
+        thread.join()
+        assert len(results) == 1
+        assert pool.created() == 1
+
+
+class PutTests(BaseTestCase):
+    def test_does_not_change_created(self):
+        pool = make_pool(max_connections=2)
+        conn = pool.get()
+        pool.put(conn)
+        pool.put(pool.get())
+        assert pool.created() == 1
+
+
+class HealthTests(BaseTestCase):
+    def test_closed_connection_replaced(self):
+        pool = make_pool(max_connections=1)
+        conn = pool.get()
+        pool.put(conn)
+        conn.open = False
+        new_conn = pool.get()
+        assert new_conn is not conn
+        assert new_conn.is_open()
+        assert pool.created() == 1
+
+    def test_put_closed_connection_discarded(self):
+        pool = make_pool(max_connections=1)
+        conn = pool.get()
+        conn.open = False
+        pool.put(conn)
+        assert pool.created() == 0
+        assert pool.get() is not conn
+
+    def test_no_ping_by_default(self):
+        pool = make_pool()
+        conn = pool.get()
+        pool.put(conn)
+        pool.get()
+        assert conn.pings == 0
+
+    def test_ping_after_interval(self):
+        pool = make_pool(ping_interval=0)
+        conn = pool.get()
+        pool.put(conn)
+        assert pool.get() is conn
+        assert conn.pings == 1
+
+    def test_no_ping_within_interval(self):
+        pool = make_pool(ping_interval=60)
+        conn = pool.get()
+        pool.put(conn)
+        assert pool.get() is conn
+        assert conn.pings == 0
+
+    def test_failed_ping_replaces_connection(self):
+        pool = make_pool(ping_interval=0)
+        conn = pool.get()
+        pool.put(conn)
+        # Socket still looks open, but the server went away
+        conn.reachable = False
+        assert pool.get() is not conn
+        assert not conn.is_open()
+
+
+class RunTests(BaseTestCase):
+    def test_returns_result(self):
+        pool = make_pool()
+        assert pool.run(FakeQuery(), durability='soft') == {'durability': 'soft'}
+        assert len(pool._idle) == 1
+
+    def test_retries_broken_held_connection(self):
+        pool = make_pool()
+        query = FakeQuery()
+        with pool.pinned() as conn:
+            conn.close()
+            pool.run(query)
+        assert len(query.connections) == 1
+        assert query.connections[0] is not conn
+        assert pool.created() == 1
+
+    def test_gives_up_after_retries(self):
+        pool = make_pool(retries=0)
+        query = FakeQuery()
+        with pool.pinned() as conn:
+            conn.close()
+            with pytest.raises(ReqlDriverError):
+                pool.run(query)
+        assert query.connections == []
+        assert pool.created() == 0
+
+    def test_sent_query_not_retried(self):
+        pool = make_pool(retries=3)
+        query = FakeQuery(failures=1)
+        with pytest.raises(ReqlDriverError):
+            pool.run(query)
+        assert len(query.connections) == 1
+        assert not query.connections[0].is_open()
+        assert pool.created() == 0
+
+    def test_write_not_sent_twice(self):
+        pool = make_pool()
+        query = r.table('artists').insert({'name': 'Andrei'})
+        sent = []
+
+        def run(c=None, **global_optargs):
+            sent.append(c)
+            raise ReqlDriverError('Connection is closed.')
+        query.run = run
+        with pytest.raises(ReqlDriverError):
+            pool.run(query)
+        assert len(sent) == 1
+
+    def test_query_error_not_retried(self):
+        pool = make_pool()
+        query = FakeQuery(failures=1, error=ReqlRuntimeError)
+        with pytest.raises(ReqlRuntimeError):
+            pool.run(query)
+        assert len(query.connections) == 1
+        assert query.connections[0].is_open()
+        assert len(pool._idle) == 1
+
+
+class PinnedTests(BaseTestCase):
+    def test_queries_share_connection(self):
+        pool = make_pool()
+        query = FakeQuery()
+        with pool.pinned() as conn:
+            pool.run(query)
+            pool.run(query)
+            assert pool.created() == 1
+        assert query.connections == [conn, conn]
+
+    def test_connection_not_idle_during_block(self):
+        pool = make_pool()
+        with pool.pinned():
+            pool.run(FakeQuery())
+            assert len(pool._idle) == 0
+        assert len(pool._idle) == 1
+
+    def test_nested(self):
+        pool = make_pool()
+        with pool.pinned() as conn:
+            with pool.pinned() as nested_conn:
+                assert nested_conn is conn
+            assert len(pool._idle) == 0
+        assert len(pool._idle) == 1
+
+    def test_threads_pin_different_connections(self):
+        pool = make_pool()
+        conns = []
+
+        def pin():
+            with pool.pinned() as conn:
+                conns.append(conn)
+                time.sleep(0.02)
+
+        threads = [Thread(target=pin) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert conns[0] is not conns[1]
+
+    def test_broken_connection_replaced(self):
+        pool = make_pool()
+        query = FakeQuery(failures=1)
+        with pool.pinned():
+            with pytest.raises(ReqlDriverError):
+                pool.run(query)
+            pool.run(query)
+            pool.run(query)
+        assert query.connections[0] is not query.connections[1]
+        assert query.connections[1] is query.connections[2]
+        assert pool.created() == 1
+
+
+class ThreadAffinityTests(BaseTestCase):
+    def test_connection_kept_between_queries(self):
+        pool = make_pool(thread_affinity=True)
+        query = FakeQuery()
+        pool.run(query)
+        pool.run(query)
+        assert query.connections[0] is query.connections[1]
+        assert len(pool._idle) == 0
+
+    def test_connection_released_when_thread_ends(self):
+        pool = make_pool(thread_affinity=True)
+        thread = Thread(target=lambda: pool.run(FakeQuery()))
+        thread.start()
+        thread.join()
+        assert len(pool._idle) == 1
+
+
+class UnreachableHostConnection(FakeConnection):
+    unreachable = ('db1',)
+
+    def __init__(self, **kwargs):
+        if kwargs.get('host') in self.unreachable:
+            raise ReqlDriverError('Could not connect to %s' % kwargs['host'])
+        super(UnreachableHostConnection, self).__init__(**kwargs)
+        self.conn.host = kwargs.get('host')
+
+
+class MultiHostTests(BaseTestCase):
+    def test_connections_spread_over_hosts(self):
+        pool = make_pool(UnreachableHostConnection, hosts=['db2', 'db3:28016'])
+        conns = [pool.get() for _ in range(4)]
+        assert [conn.host for conn in conns] == ['db2', 'db3', 'db2', 'db3']
+
+    def test_host_overrides_connection_kwargs(self):
+        created = []
+
+        def connection_class(**kwargs):
+            created.append(FakeConnection(**kwargs))
+            return created[-1]
+
+        pool = make_pool(connection_class, hosts=[('db2', 28016)],
+                         host='localhost', db='test')
+        pool.get()
+        assert created[0].kwargs == {'host': 'db2', 'port': 28016, 'db': 'test'}
+
+    def test_fails_over_unreachable_host(self):
+        pool = make_pool(UnreachableHostConnection, hosts=['db1', 'db2'])
+        assert pool.get().host == 'db2'
+        assert not pool.cluster.nodes[0].available
+
+    def test_all_hosts_unreachable(self):
+        pool = make_pool(UnreachableHostConnection, hosts=['db1'])
+        with pytest.raises(ReqlDriverError):
+            pool.get()
+        assert pool.created() == 0
+
+    def test_in_flight_tracked(self):
+        pool = make_pool(UnreachableHostConnection, hosts=['db2', 'db3'])
+        conn = pool.get()
+        node = pool._nodes[conn]
+        assert node.in_flight == 1
+        pool.put(conn)
+        assert node.in_flight == 0
+        pool.get()
+        assert node.in_flight == 1
+
+    def test_idle_connection_to_preferred_node_reused(self):
+        pool = make_pool(UnreachableHostConnection, hosts=['db2', 'db3'],
+                         balance='least_in_flight')
+        conn2, conn3 = pool.get(), pool.get()
+        pool.put(conn2)
+        pool.put(conn3)
+        first = pool.get()
+        # The other node now has fewer connections in flight
+        assert pool.get().host != first.host
+
+    def test_broken_connection_ejects_node(self):
+        pool = make_pool(UnreachableHostConnection, hosts=['db2', 'db3'])
+        query = FakeQuery(failures=1)
+        with pytest.raises(ReqlDriverError):
+            pool.run(query)
+        pool.run(query)
+        assert query.connections[0].host != query.connections[1].host
+        assert len([node for node in pool.cluster.nodes if not node.available]) == 1
+
+
+class StatsTests(BaseTestCase):
+    def test_connection_counts(self):
+        pool = make_pool(max_connections=3)
+        conn = pool.get()
+        pool.get()
+        pool.put(conn)
+        stats = pool.stats()
+        assert stats['max_connections'] == 3
+        assert stats['total'] == 2
+        assert stats['in_use'] == 1
+        assert stats['idle'] == 1
+        assert stats['waiting'] == 0
+
+    def test_created_and_closed(self):
+        pool = make_pool()
+        conn = pool.get()
+        conn.open = False
+        pool.put(conn)
+        pool.get()
+        stats = pool.stats()
+        assert stats['created'] == 2
+        assert stats['closed'] == 1
+
+    def test_checkouts(self):
+        pool = make_pool()
+        pool.put(pool.get())
+        pool.get()
+        stats = pool.stats()
+        assert stats['checkouts'] == 2
+        assert stats['checkout_time']['count'] == 2
+
+    def test_exhausted(self):
+        pool = make_pool(max_connections=1)
+        pool.get()
+        try:
+            pool.get()
+        except PoolExhaustedError:
+            pass
+        assert pool.stats()['exhausted'] == 1
+
+    def test_waits(self):
+        pool = make_pool(max_connections=1, block=True, timeout=0.01)
+        pool.get()
+        try:
+            pool.get()
+        except PoolExhaustedError:
+            pass
+        stats = pool.stats()
+        assert stats['waits'] == 1
+        assert stats['exhausted'] == 1
+
+    def test_nodes(self):
+        pool = make_pool(hosts=['db1', 'db2'])
+        pool.get()
+        nodes = pool.stats()['nodes']
+        assert [node['host'] for node in nodes] == ['db1', 'db2']
+        assert [node['in_flight'] for node in nodes] == [1, 0]
+
+    def test_prometheus(self):
+        pool = make_pool()
+        pool.get()
+        assert 'remodel_pool_connections_in_use 1\n' in pool.prometheus()
+
+
+class WarmTests(BaseTestCase):
+    def test_opens_min_connections(self):
+        pool = make_pool(min_connections=3)
+        pool.warm()
+        assert pool.created() == 3
+        assert len(pool._idle) == 3
+
+    def test_explicit_number(self):
+        pool = make_pool()
+        pool.warm(2)
+        assert len(pool._idle) == 2
+
+    def test_capped_by_max_connections(self):
+        pool = make_pool(max_connections=2, min_connections=5)
+        pool.warm()
+        assert pool.created() == 2
+
+    def test_counts_existing_connections(self):
+        pool = make_pool()
+        pool.get()
+        pool.warm(2)
+        assert pool.created() == 2
+        assert len(pool._idle) == 1
+
+    def test_failure(self):
+        pool = make_pool(FailingConnection, min_connections=2)
+        with pytest.raises(RuntimeError):
+            pool.warm()
+        assert pool.created() == 0
+
+    def test_topped_up_on_checkout(self):
+        pool = make_pool(min_connections=3)
+        pool.get()
+        for _ in range(100):
+            if pool.created() == 3:
+                break
+            time.sleep(0.01)
+        assert pool.created() == 3
+
+    def test_topped_up_after_discard(self):
+        pool = make_pool(min_connections=2)
+        pool.warm()
+        conn = pool.get()
+        pool.discard(conn)
+        for _ in range(100):
+            if pool.created() == 2:
+                break
+            time.sleep(0.01)
+        assert pool.created() == 2
+        assert conn not in [entry[0] for entry in pool._idle]
+
+
+class ReapTests(BaseTestCase):
+    def test_no_limits(self):
+        pool = make_pool()
+        pool.put(pool.get())
+        assert pool.reap() == 0
+        assert pool._reaper is None
+
+    def test_idle_connections_closed(self):
+        pool = make_pool(max_idle_time=0, reap_interval=60)
+        conn = pool.get()
+        pool.put(conn)
+        assert pool.reap() == 1
+        assert not conn.is_open()
+        assert pool.created() == 0
+
+    def test_recently_used_connections_kept(self):
+        pool = make_pool(max_idle_time=60)
+        pool.put(pool.get())
+        assert pool.reap() == 0
+        assert pool.created() == 1
+
+    def test_min_connections_kept(self):
+        pool = make_pool(max_idle_time=0, min_connections=1,
+                         reap_interval=60)
+        pool.warm(3)
+        assert pool.reap() == 2
+        assert pool.created() == 1
+
+    def test_checked_out_connections_kept(self):
+        pool = make_pool(max_idle_time=0, reap_interval=60)
+        conn = pool.get()
+        assert pool.reap() == 0
+        assert conn.is_open()
+
+    def test_old_connections_recycled_one_at_a_time(self):
+        pool = make_pool(max_lifetime=60, reap_interval=60)
+        pool.warm(2)
+        pool.max_lifetime = 0
+        assert pool.reap() == 1
+        assert pool.created() == 1
+
+    def test_old_connection_closed_when_put_back(self):
+        pool = make_pool(max_lifetime=0, reap_interval=60)
+        conn = pool.get()
+        pool.put(conn)
+        assert not conn.is_open()
+        assert pool.created() == 0
+
+    def test_lifetimes_jittered(self):
+        pool = make_pool(max_connections=20, max_lifetime=100, reap_interval=60)
+        conns = [pool.get() for _ in range(20)]
+        for conn in conns:
+            pool._opened_at[conn] -= 95
+        for conn in conns:
+            pool.put(conn)
+        # Connections opened together are not all closed together
+        assert 0 < pool.created() < 20
+
+    def test_reaper_thread(self):
+        pool = make_pool(max_idle_time=0.01, reap_interval=0.01)
+        assert pool._reaper.is_alive()
+        pool.put(pool.get())
+        for _ in range(100):
+            if pool.created() == 0:
+                break
+            time.sleep(0.01)
+        assert pool.created() == 0
+
+    def test_reaper_thread_stops_without_limits(self):
+        pool = make_pool(max_idle_time=0.01)
+        reaper = pool._reaper
+        pool.configure()
+        reaper.join(1)
+        assert not reaper.is_alive()
+
+
+class ForkTests(BaseTestCase):
+    def simulate_fork(self, pool):
+        # Pretend the pool was set up by another (parent) process
+        pool._pid = -1
+
+    def test_inherited_connections_dropped(self):
+        pool = make_pool()
+        conn = pool.get()
+        pool.put(conn)
+        self.simulate_fork(pool)
+        assert pool.get() is not conn
+        assert pool.created() == 1
+        # Must not be closed, the parent process still uses it
+        assert conn.is_open()
+
+    def test_counters_reset(self):
+        pool = make_pool(max_connections=1)
+        pool.get()
+        self.simulate_fork(pool)
+        pool.get()
+        stats = pool.stats()
+        assert stats['created'] == 1
+        assert stats['in_use'] == 1
+        assert pool.cluster.nodes[0].in_flight == 1
+
+    def test_inherited_connection_put_back_ignored(self):
+        pool = make_pool()
+        conn = pool.get()
+        self.simulate_fork(pool)
+        pool.get()
+        pool.put(conn)
+        assert len(pool._idle) == 0
+        assert conn.is_open()
+
+    def test_inherited_connection_discard_ignored(self):
+        pool = make_pool()
+        conn = pool.get()
+        pool.reset_after_fork()
+        pool.discard(conn)
+        assert conn.is_open()
+        assert pool.created() == 0
+
+    def test_inherited_pin_dropped(self):
+        pool = make_pool()
+        with pool.pinned() as conn:
+            self.simulate_fork(pool)
+            with pool.pinned() as child_conn:
+                assert child_conn is not conn
+        assert len(pool._idle) == 1
+        assert pool._idle[0][0] is child_conn
+
+    def test_fork_hook_resets_live_pools(self):
+        pool = make_pool()
+        feed_conn = pool.feeds.get()
+        pool.put(pool.get())
+        reset_pools_after_fork()
+        assert pool.created() == 0
+        assert pool.feeds.created() == 0
+        assert feed_conn.is_open()
+
+    def test_collected_pools_forgotten(self):
+        gc.collect()
+        count = len(live_pools)
+        make_pool().feeds
+        gc.collect()
+        assert len(live_pools) == count
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork()')
+    def test_fork(self):
+        pool = make_pool()
+        conn = pool.get()
+        pool.put(conn)
+        pid = os.fork()
+        if pid == 0:
+            # Child process; report through the exit code
+            os._exit(0 if pool.created() == 0 and pool.get() is not conn else 1)
+        _, status = os.waitpid(pid, 0)
+        assert status == 0
+        assert pool.created() == 1
+
+
+class PoolRegistryTests(BaseTestCase):
+    def test_default_pool(self):
+        assert pools.get('default') is pool
+
+    def test_register(self):
+        registry = PoolRegistry()
+        analytics = registry.register('analytics', ConnectionPool())
+        assert registry.get('analytics') is analytics
+        assert len(registry) == 1
+
+    def test_register_twice(self):
+        registry = PoolRegistry()
+        registry.register('analytics', ConnectionPool())
+        with pytest.raises(AlreadyRegisteredError):
+            registry.register('analytics', ConnectionPool())
+
+    def test_register_invalid(self):
+        with pytest.raises(ValueError):
+            PoolRegistry().register('analytics', object())
+
+    def test_get_unregistered(self):
+        with pytest.raises(KeyError):
+            PoolRegistry().get('analytics')
+
+    def test_unregister(self):
+        registry = PoolRegistry()
+        registry.register('analytics', ConnectionPool())
+        registry.unregister('analytics')
+        assert len(registry) == 0
+
+    def test_unregister_default(self):
+        with pytest.raises(ValueError):
+            pools.unregister('default')
+
+    def test_configure_creates(self):
+        registry = PoolRegistry()
+        analytics = registry.configure('analytics', max_connections=2, host='db9')
+        assert registry.get('analytics') is analytics
+        assert analytics.max_connections == 2
+        assert analytics.connection_kwargs == {'host': 'db9'}
+
+    def test_configure_existing(self):
+        registry = PoolRegistry()
+        analytics = registry.register('analytics', ConnectionPool())
+        assert registry.configure('analytics', max_connections=2) is analytics
+        assert analytics.max_connections == 2
+
+
+class QueryTimeoutTests(BaseTestCase):
+    def test_no_timeout(self):
+        pool = make_pool()
+        assert pool.run(SlowQuery(0.02)) == 'done'
+
+    def test_within_timeout(self):
+        pool = make_pool(query_timeout=1)
+        assert pool.run(SlowQuery(0.02)) == 'done'
+        assert pool._idle[0][0].is_open()
+
+    def test_timeout(self):
+        pool = make_pool(query_timeout=0.02)
+        started = time.time()
+        with pytest.raises(QueryTimeoutError) as excinfo:
+            pool.run(SlowQuery(1))
+        assert time.time() - started < 0.5
+        assert excinfo.value.timeout == 0.02
+
+    def test_timed_out_connection_replaced(self):
+        pool = make_pool(query_timeout=0.02)
+        with pytest.raises(QueryTimeoutError):
+            pool.run(SlowQuery(1))
+        assert pool.created() == 0
+        # Slow queries are not a sign of a failing node
+        assert pool.cluster.nodes[0].available
+
+    def test_timeout_not_retried(self):
+        pool = make_pool(query_timeout=0.02)
+        query = SlowQuery(1)
+        calls = []
+        run = query.run
+        query.run = lambda c=None, **kwargs: calls.append(c) or run(c, **kwargs)
+        with pytest.raises(QueryTimeoutError):
+            pool.run(query)
+        assert len(calls) == 1
+
+    def test_per_query_timeout(self):
+        pool = make_pool(query_timeout=1)
+        with pytest.raises(QueryTimeoutError):
+            pool.run(SlowQuery(1), query_timeout=0.02)
+
+    def test_per_query_timeout_not_passed_to_query(self):
+        pool = make_pool()
+        assert pool.run(FakeQuery(), query_timeout=1, durability='soft') == {'durability': 'soft'}
+
+    def test_single_watchdog_thread(self):
+        pool = make_pool(max_connections=3, query_timeout=1)
+        threads = [Thread(target=pool.run, args=(SlowQuery(0.2),)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        watchdog = pool._watchdog._thread
+        assert len(pool._watchdog._deadlines) == 3
+        for thread in threads:
+            thread.join()
+        with pytest.raises(QueryTimeoutError):
+            pool.run(SlowQuery(1), query_timeout=0.02)
+        assert pool._watchdog._thread is watchdog
+        assert pool._watchdog._deadlines == []
+
+
+class FakeCursor(object):
+    def __init__(self, items):
+        self.items = list(items)
+        self.closed = False
+
+    def next(self, wait=True):
+        if not self.items:
+            raise StopIteration()
+        return self.items.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeFeedQuery(object):
+    def __init__(self, items=()):
+        self.items = items
+        self.connections = []
+
+    def run(self, c=None, **global_optargs):
+        self.connections.append(c)
+        return FakeCursor(self.items)
+
+
+class IsChangefeedTests(BaseTestCase):
+    def test_changes(self):
+        assert is_changefeed(r.table('artists').changes())
+
+    def test_chained_on_changes(self):
+        assert is_changefeed(r.table('artists').changes()['new_val'].pluck('name'))
+
+    def test_regular_query(self):
+        assert not is_changefeed(r.table('artists').filter({'name': 'Andrei'}))
+
+    def test_not_a_query(self):
+        assert not is_changefeed(FakeQuery())
+
+
+class FeedTests(BaseTestCase):
+    def test_feed_lane(self):
+        pool = make_pool(max_feed_connections=2)
+        assert pool.feeds.max_connections == 2
+        assert pool.feeds.cluster is pool.cluster
+        assert pool.feeds.connection_class is pool.connection_class
+
+    def test_single_feed_lane(self):
+        pool = make_pool()
+        lanes = []
+        threads = [Thread(target=lambda: lanes.append(pool.feeds)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert all(lane is lanes[0] for lane in lanes)
+
+    def test_connection_held_until_closed(self):
+        pool = make_pool()
+        cursor = pool.run_feed(FakeFeedQuery([1, 2]))
+        assert pool.created() == 0
+        assert pool.feeds.stats()['in_use'] == 1
+        cursor.close()
+        assert cursor.cursor.closed
+        assert pool.feeds.stats()['in_use'] == 0
+
+    def test_connection_released_when_exhausted(self):
+        pool = make_pool()
+        cursor = pool.run_feed(FakeFeedQuery([1, 2]))
+        assert list(cursor) == [1, 2]
+        assert pool.feeds.stats()['in_use'] == 0
+
+    def test_abandoned_feed_closed(self):
+        pool = make_pool()
+        cursor = pool.run_feed(FakeFeedQuery([1, 2]))
+        feed = cursor.cursor
+        del cursor
+        gc.collect()
+        assert feed.closed
+        assert pool.feeds.stats()['in_use'] == 0
+
+    def test_feeds_do_not_use_query_connections(self):
+        pool = make_pool(max_connections=1, max_feed_connections=2)
+        feeds = [pool.run_feed(FakeFeedQuery()) for _ in range(2)]
+        assert pool.run(FakeQuery()) == {}
+        with pytest.raises(PoolExhaustedError):
+            pool.run_feed(FakeFeedQuery())
+        feeds[0].close()
+        pool.run_feed(FakeFeedQuery())
+
+    def test_context_manager(self):
+        pool = make_pool()
+        with pool.run_feed(FakeFeedQuery([1])):
+            assert pool.feeds.stats()['in_use'] == 1
+        assert pool.feeds.stats()['in_use'] == 0
+
+    def test_run_routes_changefeeds(self):
+        pool = make_pool()
+        query = r.table('artists').changes()
+        query.run = FakeFeedQuery().run
+        assert isinstance(pool.run(query), FeedCursor)
+
+
+class StreamTests(BaseTestCase):
+    def test_connection_held_until_exhausted(self):
+        pool = make_pool()
+        query = FakeFeedQuery([1, 2])
+        cursor = pool.stream(query, max_batch_rows=1)
+        assert isinstance(cursor, FeedCursor)
+        assert pool.stats()['in_use'] == 1
+        assert list(cursor) == [1, 2]
+        assert pool.stats()['in_use'] == 0
+        assert pool.feeds.created() == 0
+
+    def test_connection_released_when_closed(self):
+        pool = make_pool()
+        cursor = pool.stream(FakeFeedQuery([1, 2]))
+        cursor.close()
+        assert pool.stats()['in_use'] == 0
+
+    def test_whole_results_release_connection(self):
+        pool = make_pool()
+        assert pool.stream(FakeQuery(), max_batch_rows=1) == {'max_batch_rows': 1}
+        assert pool.stats()['in_use'] == 0
+
+    def test_broken_connection_discarded(self):
+        pool = make_pool()
+        with pytest.raises(ReqlDriverError):
+            pool.stream(FakeQuery(failures=1))
+        assert pool.stats()['in_use'] == 0
+        assert pool.created() == 0
+
+    def test_queries_share_streaming_connection(self):
+        pool = make_pool(max_connections=1)
+        feed, query = FakeFeedQuery([1, 2]), FakeQuery()
+        for _ in pool.stream(feed):
+            pool.run(query)
+        assert query.connections == feed.connections * 2
+        assert pool.stats()['in_use'] == 0
+
+    def test_released_from_another_thread(self):
+        pool = make_pool(max_connections=1)
+        cursor = pool.stream(FakeFeedQuery([1, 2]))
+        thread = Thread(target=cursor.close)
+        thread.start()
+        thread.join()
+        assert pool.stats()['in_use'] == 0
+        pool.run(FakeQuery())
+        assert pool.stats()['in_use'] == 0
+
+    def test_pinned_block_outlives_cursor(self):
+        pool = make_pool(max_connections=1)
+        cursor = pool.stream(FakeFeedQuery([1, 2]))
+        with pool.pinned():
+            cursor.close()
+            assert pool.stats()['in_use'] == 1
+        assert pool.stats()['in_use'] == 0
+
+    def test_pinned_connection_used(self):
+        pool = make_pool(max_connections=1)
+        query = FakeFeedQuery([1])
+        with pool.pinned() as connection:
+            cursor = pool.stream(query)
+            assert not isinstance(cursor, FeedCursor)
+            assert query.connections == [connection]
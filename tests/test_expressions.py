@@ -0,0 +1,45 @@
+from rethinkdb import r
+
+from remodel.expressions import F, compile_fields
+
+from . import BaseTestCase
+
+
+def compiled(expression):
+    return str(expression.compile(r.row))
+
+
+class ExpressionTests(BaseTestCase):
+    def test_field(self):
+        assert compiled(F('views')) == str(r.row['views'])
+
+    def test_arithmetic(self):
+        assert compiled(F('views') + 1) == str(r.row['views'] + 1)
+        assert compiled(F('views') - 1) == str(r.row['views'] - 1)
+        assert compiled(F('price') * 2) == str(r.row['price'] * 2)
+        assert compiled(F('price') / 2) == str(r.row['price'] / 2)
+
+    def test_reversed_arithmetic(self):
+        assert compiled(1 + F('views')) == str(r.expr(1) + r.row['views'])
+        assert compiled(10 - F('views')) == str(r.expr(10) - r.row['views'])
+
+    def test_fields(self):
+        assert compiled(F('a') + F('b')) == str(r.row['a'] + r.row['b'])
+
+    def test_nested_field(self):
+        assert compiled(F('stats')['views'] + 1) == str(r.row['stats']['views'] + 1)
+
+    def test_default(self):
+        assert compiled(F('views').default(0) + 1) == str(r.row['views'].default(0) + 1)
+
+    def test_array_operations(self):
+        assert compiled(F('tags').append('a')) == str(r.row['tags'].append('a'))
+        assert compiled(F('tags').prepend('a')) == str(r.row['tags'].prepend('a'))
+        assert compiled(F('tags').set_insert('a')) == str(r.row['tags'].set_insert('a'))
+        assert compiled(F('tags').set_union(['a'])) == str(r.row['tags'].set_union(['a']))
+        assert compiled(F('tags').difference(['a'])) == str(r.row['tags'].difference(['a']))
+
+    def test_compile_fields(self):
+        fields = compile_fields({'views': F('views') + 1, 'title': 'Foo'})
+        assert str(fields['views']) == str(r.row['views'] + 1)
+        assert fields['title'] == 'Foo'
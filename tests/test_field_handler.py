@@ -223,6 +223,34 @@ class AttributeAccessTests(BaseTestCase):
         a['bio']
         del a['bio']
 
+    def test_deferred_field(self):
+        class Artist(Model):
+            pass
+
+        a = Artist()
+        a.fields.__dict__.update(id=1, name='Andrei')
+        a.fields._deferred = frozenset(['bio'])
+        with pytest.raises(AttributeError) as excinfo:
+            a.fields.bio
+        assert 'deferred' in str(excinfo.value)
+        assert 'bio' not in a
+        a['bio'] = 'Born'
+        assert a['bio'] == 'Born'
+
+    def test_only_fields(self):
+        class Artist(Model):
+            pass
+
+        a = Artist()
+        a.fields.__dict__.update(id=1, name='Andrei')
+        a.fields._only = frozenset(['id', 'name'])
+        assert a['name'] == 'Andrei'
+        assert a.fields.is_deferred('bio')
+        assert not a.fields.is_deferred('name')
+        with pytest.raises(KeyError):
+            a['bio']
+        assert a.fields.as_dict() == {'id': 1, 'name': 'Andrei'}
+
 
 class AsDictTests(DbBaseTestCase):
     def setUp(self):
@@ -68,3 +68,13 @@ class CreateIndexesTests(DbBaseTestCase):
         create_indexes()
         create_indexes()
         self.assert_indexes_created('orders', ['customer_id'])
+
+    def test_declared_indexes(self):
+        class Order(Model):
+            indexes = ('status', ('customer_id', 'created_at'))
+
+        create_tables()
+        create_indexes()
+        self.assert_indexes_created('orders', ['status', 'customer_id_created_at'])
+        assert (r.table('orders').index_status('customer_id_created_at')
+                 .nth(0)['multi'].run()) is False
@@ -0,0 +1,63 @@
+from remodel.metrics import Histogram, PoolStats, to_prometheus
+
+from . import BaseTestCase
+
+
+class HistogramTests(BaseTestCase):
+    def test_empty(self):
+        histogram = Histogram(buckets=(0.1, 1))
+        assert histogram.as_dict() == {'buckets': {0.1: 0, 1: 0}, 'sum': 0, 'count': 0}
+
+    def test_cumulative_buckets(self):
+        histogram = Histogram(buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(0.5)
+        histogram.observe(2)
+        result = histogram.as_dict()
+        assert result['buckets'] == {0.1: 2, 1: 3}
+        assert result['count'] == 4
+        assert result['sum'] == 2.65
+
+
+class PoolStatsTests(BaseTestCase):
+    def test_incr(self):
+        stats = PoolStats()
+        stats.incr('created')
+        stats.incr('created')
+        assert stats.as_dict()['created'] == 2
+
+    def test_observe_checkout(self):
+        stats = PoolStats()
+        stats.observe_checkout(0.01)
+        result = stats.as_dict()
+        assert result['checkouts'] == 1
+        assert result['checkout_time']['count'] == 1
+
+
+class ToPrometheusTests(BaseTestCase):
+    def setUp(self):
+        super(ToPrometheusTests, self).setUp()
+        self.stats = PoolStats().as_dict()
+        self.stats.update(max_connections=5, total=2, in_use=1, idle=1, waiting=0,
+                          nodes=[{'host': 'db1', 'port': 28015, 'in_flight': 1}])
+
+    def test_gauges(self):
+        text = to_prometheus(self.stats)
+        assert '# TYPE remodel_pool_connections_in_use gauge' in text
+        assert 'remodel_pool_connections_in_use 1\n' in text
+        assert 'remodel_pool_node_connections_in_use{node="db1:28015"} 1\n' in text
+
+    def test_counters(self):
+        text = to_prometheus(self.stats)
+        assert '# TYPE remodel_pool_created_total counter' in text
+        assert 'remodel_pool_created_total 0\n' in text
+
+    def test_histogram(self):
+        text = to_prometheus(self.stats)
+        assert 'remodel_pool_checkout_seconds_bucket{le="+Inf"} 0\n' in text
+        assert 'remodel_pool_checkout_seconds_count 0\n' in text
+
+    def test_prefix_and_labels(self):
+        text = to_prometheus(self.stats, prefix='app_pool', labels={'service': 'api'})
+        assert 'app_pool_connections_idle{service="api"} 1\n' in text
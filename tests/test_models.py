@@ -1,15 +1,18 @@
 import pytest
+import re
 from rethinkdb import r
 
+from remodel.connection import pools
 from remodel.errors import OperationError
+from remodel.expressions import F
 from remodel.helpers import create_tables, create_indexes
 from remodel.models import Model, before_save, after_save, before_delete, after_delete, after_init
 from remodel.object_handler import ObjectHandler
-from remodel.registry import model_registry
+from remodel.registry import index_registry, model_registry
 from remodel.related import (HasOneDescriptor, BelongsToDescriptor,
                              HasManyDescriptor, HasAndBelongsToManyDescriptor)
 
-from . import BaseTestCase, DbBaseTestCase
+from . import BaseTestCase, DbBaseTestCase, RecordingPool
 
 
 class ModelTests(BaseTestCase):
@@ -39,6 +42,43 @@ class ModelTests(BaseTestCase):
 
         assert Artist.table_name == 'artist_tbl'
 
+    def test_default_run_options(self):
+        class Artist(Model):
+            pass
+
+        assert Artist.run_options == {}
+
+    def test_custom_run_options(self):
+        class Artist(Model):
+            run_options = {'durability': 'soft'}
+
+        assert Artist.run_options == {'durability': 'soft'}
+
+    def test_default_pool_and_db(self):
+        class Artist(Model):
+            pass
+
+        assert Artist.pool == 'default'
+        assert Artist.db is None
+        assert str(Artist.objects.query) == str(r.table('artists'))
+
+    def test_custom_db(self):
+        class Artist(Model):
+            db = 'music'
+
+        assert str(Artist.objects.query) == str(r.db('music').table('artists'))
+
+    def test_declared_indexes(self):
+        class Artist(Model):
+            indexes = ('name', ('country', 'city'))
+
+        assert index_registry.get_for_model('Artist') == set(['name', ('country', 'city')])
+
+    def test_colliding_index_names(self):
+        with pytest.raises(ValueError):
+            class Artist(Model):
+                indexes = ('last_name', ('last', 'name'))
+
     def test_default_object_handler_cls(self):
         class Artist(Model):
             pass
@@ -288,6 +328,62 @@ class SaveTests(DbBaseTestCase):
         a.save()
         self.assert_saved(a.table_name, a.fields.as_dict())
 
+    def test_update_deferred(self):
+        self.Artist.create(name='Andrei', bio='Born')
+        a = self.Artist.all().defer('bio')[0]
+        a['country'] = 'Romania'
+        a.save()
+        self.assert_saved(a.table_name, {'name': 'Andrei', 'bio': 'Born',
+                                         'country': 'Romania'})
+
+    def test_update_only(self):
+        self.Artist.create(name='Andrei', bio='Born', country='Romania')
+        a = self.Artist.all().only('name', 'country')[0]
+        del a['country']
+        a.save()
+        assert 'country' not in a
+        self.assert_saved(a.table_name, {'name': 'Andrei', 'bio': 'Born'})
+
+    def test_update_with_expressions(self):
+        a = self.Artist.create(name='Andrei', plays=1, tags=['rock'])
+        a.update(plays=F('plays') + 1, tags=F('tags').set_insert('pop'), country='Romania')
+        assert a['plays'] == 2
+        assert a['tags'] == ['rock', 'pop']
+        self.assert_saved(a.table_name, {'name': 'Andrei', 'plays': 2, 'country': 'Romania'})
+
+    def test_update_with_expressions_is_atomic(self):
+        a = self.Artist.create(plays=1)
+        stale = self.Artist.get(a['id'])
+        a.update(plays=F('plays') + 1)
+        stale.update(plays=F('plays') + 1)
+        assert stale['plays'] == 3
+
+    def test_update_with_expressions_not_saved(self):
+        with pytest.raises(OperationError):
+            self.Artist().update(plays=F('plays') + 1)
+
+    def test_update_restricted_field_with_expressions(self):
+        a = self.Artist.create()
+        with pytest.raises(AttributeError):
+            a.update(person_id=F('person_id'))
+
+    def test_update_loaded(self):
+        self.Artist.create(name='Andrei', bio='Born', address={'city': 'X', 'zip': 1})
+        a = self.Artist.all()[0]
+        a['name'] = 'Bob'
+        a['address'] = {'city': 'Y'}
+        del a['bio']
+        a.save()
+        stored = r.table(a.table_name).get(a['id']).run()
+        assert stored == {'id': a['id'], 'name': 'Bob', 'address': {'city': 'Y'}}
+
+    def test_with_run_options(self):
+        self.Artist.run_options = {'durability': 'soft'}
+        a = self.Artist(name='Andrei')
+        a.save()
+        a.save()
+        self.assert_saved(a.table_name, a.fields.as_dict())
+
     def test_belongs_to(self):
         p = self.Person()
         p.save()
@@ -396,6 +492,148 @@ class DeleteTests(DbBaseTestCase):
     # TODO: Add tests for confirming that related objects have no reference left to the deleted object
 
 
+class DirtyFieldsTests(BaseTestCase):
+    def setUp(self):
+        super(DirtyFieldsTests, self).setUp()
+        self.pool = pools.register('saving', RecordingPool({'errors': 0, 'skipped': 0}))
+
+        class Artist(Model):
+            pool = 'saving'
+        self.Artist = Artist
+        self.table = r.table('artists')
+        self.artist = Artist.objects._wrap({'id': 1, 'name': 'Andrei', 'bio': 'Born',
+                                            'tags': ['rock'], 'address': {'city': 'X'}})
+
+    def tearDown(self):
+        super(DirtyFieldsTests, self).tearDown()
+        pools.unregister('saving')
+
+    def assert_query(self, query):
+        assert [query for query, _ in self.pool.queries] == [re.sub(r'var_\d+', 'var', str(query))]
+
+    def test_changes(self):
+        self.artist['name'] = 'Bob'
+        self.artist['country'] = 'Romania'
+        del self.artist['bio']
+        changed, removed = self.artist.fields.changes()
+        assert changed == {'name': 'Bob', 'country': 'Romania'}
+        assert removed == ['bio']
+
+    def test_changes_in_place(self):
+        self.artist['tags'].append('pop')
+        self.artist['address']['zip'] = 1
+        changed, removed = self.artist.fields.changes()
+        assert changed == {'tags': ['rock', 'pop'], 'address': {'city': 'X', 'zip': 1}}
+
+    def test_not_loaded(self):
+        assert self.Artist(name='Andrei').fields.changes() is None
+
+    def test_nothing_copied_when_loaded(self):
+        assert self.artist.fields._loaded == {}
+        assert self.artist['name'] == 'Andrei'
+        assert self.artist.fields._loaded == {}
+
+    def test_containers_copied_when_read(self):
+        tags = self.artist['tags']
+        assert self.artist.fields._loaded == {'tags': ['rock']}
+        assert self.artist.fields._loaded['tags'] is not tags
+
+    def test_fields_written_directly(self):
+        self.artist.fields.remember('label_id')
+        self.artist.fields.__dict__['label_id'] = 3
+        self.artist.fields.remember('bio')
+        del self.artist.fields.__dict__['bio']
+        assert self.artist.fields.changes() == ({'label_id': 3}, ['bio'])
+
+    def test_clean(self):
+        artist = self.Artist.objects._wrap({'id': 2, 'name': 'Andrei'})
+        artist['name'] = 'Andrei'
+        artist.save()
+        assert self.pool.queries == []
+
+    def test_changed_field(self):
+        artist = self.Artist.objects._wrap({'id': 2, 'name': 'Andrei', 'bio': 'Born'})
+        artist['name'] = 'Bob'
+        artist.save()
+        self.assert_query(self.table.get(2).update({'name': 'Bob'}, return_changes=False))
+        assert artist['name'] == 'Bob'
+        assert artist.fields.changes() == ({}, [])
+
+    def test_removed_field(self):
+        artist = self.Artist.objects._wrap({'id': 2, 'name': 'Andrei', 'bio': 'Born'})
+        del artist['bio']
+        artist.save()
+        self.assert_query(self.table.get(2).update({'bio': r.literal()}, return_changes=False))
+
+    def test_objects_replaced(self):
+        artist = self.Artist.objects._wrap({'id': 2, 'address': {'city': 'X', 'zip': 1}})
+        artist['address'] = {'city': 'Y'}
+        artist.save()
+        self.assert_query(self.table.get(2).update({'address': r.literal({'city': 'Y'})},
+                                                   return_changes=False))
+
+    def test_unchanged_containers_not_sent(self):
+        artist = self.Artist.objects._wrap({'id': 2, 'name': 'Andrei', 'tags': ['rock'],
+                                            'address': {'city': 'X'}})
+        artist['name'] = 'Bob'
+        artist.save()
+        self.assert_query(self.table.get(2).update({'name': 'Bob'}, return_changes=False))
+        self.pool.queries = []
+        artist['tags'].append('pop')
+        artist.save()
+        artist.save()
+        self.assert_query(self.table.get(2).update({'tags': ['rock', 'pop']},
+                                                   return_changes=False))
+
+    def test_lists_changed_in_place(self):
+        artist = self.Artist.objects._wrap({'id': 2, 'tags': ['rock']})
+        artist['tags'].append('pop')
+        artist.save()
+        self.assert_query(self.table.get(2).update({'tags': ['rock', 'pop']},
+                                                   return_changes=False))
+
+    def test_expressions(self):
+        artist = self.Artist.objects._wrap({'id': 2, 'plays': 1})
+        self.pool.result = {'errors': 0, 'skipped': 0,
+                            'changes': [{'new_val': {'id': 2, 'plays': 2}}]}
+        artist.update(plays=F('plays') + 1)
+        self.assert_query(self.table.get(2).update({'plays': r.row['plays'] + 1},
+                                                   return_changes='always'))
+        assert artist['plays'] == 2
+
+    def test_expressions_not_loaded(self):
+        artist = self.Artist(id=2, name='Andrei')
+        self.pool.result = {'errors': 0, 'skipped': 0,
+                            'changes': [{'new_val': {'id': 2, 'name': 'Andrei', 'plays': 2}}]}
+        artist.update(plays=F('plays') + 1)
+        # Expressions are computed from the stored document, not nested r.row
+        query = self.pool.queries[0][0]
+        assert 'r.row' not in query
+        assert "var['plays'] + r.expr(1)" in query
+        assert artist['plays'] == 2
+
+    def test_missing_document(self):
+        self.pool.result = {'errors': 0, 'skipped': 1}
+        artist = self.Artist.objects._wrap({'id': 2, 'name': 'Andrei'})
+        artist['name'] = 'Bob'
+        with pytest.raises(OperationError):
+            artist.save()
+
+    def test_callbacks_run_when_clean(self):
+        saved = []
+
+        class Song(Model):
+            pool = 'saving'
+
+            def after_save(self):
+                saved.append(self)
+
+        song = Song.objects._wrap({'id': 1})
+        song.save()
+        assert saved == [song]
+        assert self.pool.queries == []
+
+
 class GetTests(BaseTestCase):
     def setUp(self):
         super(GetTests, self).setUp()
@@ -0,0 +1,87 @@
+import pytest
+import sys
+from rethinkdb import r
+
+import remodel.connection
+from remodel.connection import pools
+from remodel.models import Model
+from remodel.utils import get_model
+
+from . import BaseTestCase, RecordingPool
+
+if sys.version_info >= (3, 5):
+    from remodel import aio
+
+
+class RunTests(BaseTestCase):
+    def setUp(self):
+        super(RunTests, self).setUp()
+        self.pool, remodel.connection.pool = remodel.connection.pool, RecordingPool(1)
+
+    def tearDown(self):
+        super(RunTests, self).tearDown()
+        remodel.connection.pool = self.pool
+
+    def test_without_connection(self):
+        assert r.expr(1).run(read_mode='outdated') == 1
+        assert remodel.connection.pool.queries == [(str(r.expr(1)), {'read_mode': 'outdated'})]
+
+
+class ModelRunTests(BaseTestCase):
+    def setUp(self):
+        super(ModelRunTests, self).setUp()
+        self.pool = pools.register('analytics', RecordingPool(2))
+
+        class PageView(Model):
+            pool = 'analytics'
+            db = 'stats'
+            run_options = {'read_mode': 'outdated'}
+        self.PageView = PageView
+
+    def tearDown(self):
+        super(ModelRunTests, self).tearDown()
+        pools.unregister('analytics')
+
+    def test_get_model(self):
+        assert get_model(self.PageView.map(r.row['path']).count()) is self.PageView
+        assert get_model(r.table('page_views')) is None
+        assert get_model(r.expr(1)) is None
+
+    def test_model_pool(self):
+        assert self.PageView.map(r.row['path']).count().run(durability='soft') == 2
+        assert len(self.pool.queries) == 1
+        assert self.pool.queries[0][1] == {'read_mode': 'outdated', 'durability': 'soft'}
+
+    def test_optargs_override_run_options(self):
+        self.PageView.pluck('path').run(read_mode='single')
+        assert self.pool.queries[0][1] == {'read_mode': 'single'}
+
+
+@pytest.mark.skipif(sys.version_info < (3, 5), reason='asyncio support requires Python 3.5+')
+class AsyncModelRunTests(BaseTestCase):
+    def setUp(self):
+        super(AsyncModelRunTests, self).setUp()
+        self.pool, aio.pool = aio.pool, RecordingPool(1)
+        pools.register('analytics', RecordingPool(2))
+        r.set_loop_type('asyncio')
+
+    def tearDown(self):
+        super(AsyncModelRunTests, self).tearDown()
+        r.set_loop_type(None)
+        aio.pool = self.pool
+        pools.unregister('analytics')
+
+    def test_run_options(self):
+        class PageView(Model):
+            run_options = {'durability': 'soft'}
+
+        PageView.pluck('path').run(read_mode='outdated')
+        assert aio.pool.queries[0][1] == {'durability': 'soft', 'read_mode': 'outdated'}
+
+    def test_other_pool(self):
+        class PageView(Model):
+            pool = 'analytics'
+
+        with pytest.raises(RuntimeError):
+            PageView.pluck('path').run()
+        assert aio.pool.queries == []
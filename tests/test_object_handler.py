@@ -1,9 +1,12 @@
 import pytest
+import re
 from rethinkdb import r
+from rethinkdb.errors import ReqlNonExistenceError
 import unittest
 
-from remodel.connection import get_conn
+from remodel.connection import get_conn, pools
 from remodel.errors import OperationError
+from remodel.expressions import F
 from remodel.helpers import create_tables, create_indexes
 from remodel.models import Model
 from remodel.object_handler import ObjectHandler, ObjectSet
@@ -11,7 +14,7 @@ from remodel.registry import model_registry
 from remodel.related import (HasOneDescriptor, BelongsToDescriptor,
                              HasManyDescriptor, HasAndBelongsToManyDescriptor)
 
-from . import BaseTestCase, DbBaseTestCase
+from . import BaseTestCase, DbBaseTestCase, RecordingPool
 
 
 class AllTests(DbBaseTestCase):
@@ -62,6 +65,91 @@ class CreateTests(DbBaseTestCase):
         assert isinstance(self.Artist.create(), self.Artist)
 
 
+class BulkCreateTests(DbBaseTestCase):
+    def setUp(self):
+        super(BulkCreateTests, self).setUp()
+
+        class Artist(Model):
+            def before_save(self):
+                self['saved'] = False
+
+            def after_save(self):
+                self.fields.saved = True
+        self.Artist = Artist
+
+        create_tables()
+        create_indexes()
+
+    def test_objects_are_saved(self):
+        artists = [self.Artist(name='Andrei'), self.Artist(name='Bob')]
+        assert self.Artist.bulk_create(artists) == artists
+        assert self.Artist.count() == 2
+        for artist in artists:
+            assert self.Artist.get(artist['id'])['name'] == artist['name']
+
+    def test_callbacks(self):
+        artist, = self.Artist.bulk_create([self.Artist(name='Andrei')])
+        assert artist['saved'] is True
+        assert self.Artist.get(artist['id'])['saved'] is False
+
+    def test_existing_ids(self):
+        artists = self.Artist.bulk_create([self.Artist(id='a'), self.Artist()])
+        assert artists[0]['id'] == 'a'
+        assert self.Artist.get(artists[1]['id']) is not None
+
+    def test_error(self):
+        self.Artist.create(id='a')
+        with pytest.raises(OperationError):
+            self.Artist.bulk_create([self.Artist(id='a')])
+
+
+class SetWriteTests(DbBaseTestCase):
+    def setUp(self):
+        super(SetWriteTests, self).setUp()
+
+        class Artist(Model):
+            saves = deletes = 0
+
+            def after_save(self):
+                type(self).saves += 1
+
+            def after_delete(self):
+                type(self).deletes += 1
+        self.Artist = Artist
+
+        create_tables()
+        create_indexes()
+        for country in ('Romania', 'Romania', 'France'):
+            self.Artist.create(country=country)
+        self.Artist.saves = 0
+
+    def test_update(self):
+        assert self.Artist.filter(country='Romania').update(active=False) == 2
+        assert self.Artist.filter(active=False).count() == 2
+        assert self.Artist.saves == 0
+
+    def test_update_with_expressions(self):
+        self.Artist.filter(country='Romania').update(plays=F('plays').default(0) + 1)
+        self.Artist.filter(country='Romania').update(plays=F('plays') * 10)
+        assert self.Artist.filter(plays=10).count() == 2
+
+    def test_update_with_callbacks(self):
+        assert self.Artist.filter(country='Romania').update(active=False,
+                                                            callbacks=True) == 2
+        assert self.Artist.filter(active=False).count() == 2
+        assert self.Artist.saves == 2
+
+    def test_delete(self):
+        assert self.Artist.filter(country='Romania').delete() == 2
+        assert self.Artist.count() == 1
+        assert self.Artist.deletes == 0
+
+    def test_delete_with_callbacks(self):
+        assert self.Artist.filter(country='Romania').delete(callbacks=True) == 2
+        assert self.Artist.count() == 1
+        assert self.Artist.deletes == 2
+
+
 class GetTests(DbBaseTestCase):
     def setUp(self):
         super(GetTests, self).setUp()
@@ -289,6 +377,502 @@ class ObjectSetTests(DbBaseTestCase):
         assert objs.result_cache == result_cache
 
 
+class RunOptionsTests(BaseTestCase):
+    def setUp(self):
+        super(RunOptionsTests, self).setUp()
+
+        class Artist(Model):
+            run_options = {'read_mode': 'outdated'}
+        self.Artist = Artist
+
+    def test_model_options(self):
+        assert self.Artist.all().run_options == {'read_mode': 'outdated'}
+
+    def test_with_options(self):
+        objs = self.Artist.all().with_options(time_format='raw')
+        assert isinstance(objs, ObjectSet)
+        assert objs.run_options == {'read_mode': 'outdated', 'time_format': 'raw'}
+
+    def test_with_options_override(self):
+        objs = self.Artist.all().with_options(read_mode='single')
+        assert objs.run_options == {'read_mode': 'single'}
+
+    def test_with_options_copies(self):
+        objs = self.Artist.all()
+        objs.with_options(read_mode='single')
+        assert objs.run_options == {'read_mode': 'outdated'}
+        assert self.Artist.run_options == {'read_mode': 'outdated'}
+
+
+class PoolTests(BaseTestCase):
+    def setUp(self):
+        super(PoolTests, self).setUp()
+        self.pool = pools.register('recording', RecordingPool(2))
+
+        class Artist(Model):
+            pool = 'recording'
+            db = 'music'
+            run_options = {'read_mode': 'outdated'}
+        self.Artist = Artist
+
+    def tearDown(self):
+        super(PoolTests, self).tearDown()
+        pools.unregister('recording')
+
+    def test_count(self):
+        assert self.Artist.count() == 2
+        assert self.pool.queries == [(str(r.db('music').table('artists').count()),
+                                      {'read_mode': 'outdated'})]
+
+    def test_iterator(self):
+        self.pool.result = [{'id': 1}]
+        objs = list(self.Artist.all())
+        assert objs[0]['id'] == 1
+        assert len(self.pool.queries) == 1
+
+    def test_iterator_chunk_size(self):
+        self.pool.result = [{'id': 1}, {'id': 2}]
+        artists = self.Artist.all()
+        assert [a['id'] for a in artists.iterator(chunk_size=100)] == [1, 2]
+        assert self.pool.queries == [(str(r.db('music').table('artists')),
+                                      {'read_mode': 'outdated', 'max_batch_rows': 100})]
+        assert artists.result_cache is None
+
+
+class IndexLookupTests(BaseTestCase):
+    def setUp(self):
+        super(IndexLookupTests, self).setUp()
+        self.pool = pools.register('recording', RecordingPool([]))
+
+        class Song(Model):
+            pool = 'recording'
+            belongs_to = ('Artist',)
+        self.Song = Song
+        self.table = r.table('songs')
+
+    def tearDown(self):
+        super(IndexLookupTests, self).tearDown()
+        pools.unregister('recording')
+
+    def assert_query(self, query):
+        assert self.pool.queries == [(str(query), {})]
+
+    def test_by_id_kwarg(self):
+        self.pool.result = {'id': 1}
+        assert self.Song.get(id=1)['id'] == 1
+        self.assert_query(self.table.get(1))
+
+    def test_by_id_and_other_kwargs(self):
+        assert self.Song.get(id=1, title='Foo') is None
+        self.assert_query(self.table.get_all(1, index='id')
+                          .filter({'title': 'Foo'}).limit(1))
+
+    def test_by_indexed_field(self):
+        assert self.Song.get(artist_id=1) is None
+        self.assert_query(self.table.get_all(1, index='artist_id').limit(1))
+
+    def test_by_indexed_and_unindexed_fields(self):
+        self.Song.get(artist_id=1, title='Foo')
+        self.assert_query(self.table.get_all(1, index='artist_id')
+                          .filter({'title': 'Foo'}).limit(1))
+
+    def test_by_unindexed_field(self):
+        self.Song.get(title='Foo')
+        self.assert_query(self.table.filter({'title': 'Foo'}).limit(1))
+
+    def test_unindexable_values_are_filtered(self):
+        self.Song.get(artist_id=None)
+        self.assert_query(self.table.filter({'artist_id': None}).limit(1))
+
+    def test_query_with_get_all_applied(self):
+        handler = ObjectHandler(self.Song,
+                                self.table.get_all(1, index='artist_id'))
+        handler.get(artist_id=1)
+        self.assert_query(self.table.get_all(1, index='artist_id')
+                          .filter({'artist_id': 1}).limit(1))
+
+
+class ExplainTests(BaseTestCase):
+    def setUp(self):
+        super(ExplainTests, self).setUp()
+
+        class Song(Model):
+            indexes = (('album', 'track'),)
+            belongs_to = ('Artist',)
+        self.Song = Song
+        self.table = r.table('songs')
+
+    def test_filter_by_index(self):
+        songs = self.Song.filter(artist_id=1, title='Foo')
+        assert songs.explain() == {
+            'index': 'artist_id', 'keys': [1], 'filter': {'title': 'Foo'},
+            'query': str(self.table.get_all(1, index='artist_id').filter({'title': 'Foo'}))}
+
+    def test_filter_by_compound_index(self):
+        songs = self.Song.filter(album='X', track=2)
+        assert songs.explain()['index'] == 'album_track'
+        assert songs.explain()['query'] == str(self.table.get_all(['X', 2],
+                                                                  index='album_track'))
+
+    def test_filter_by_ids(self):
+        songs = self.Song.filter([1, 2], title='Foo')
+        assert songs.explain()['index'] == 'id'
+        assert songs.explain()['keys'] == [1, 2]
+
+    def test_filter_by_lambda(self):
+        songs = self.Song.filter(lambda song: song['plays'] > 10, artist_id=1)
+        assert songs.explain()['index'] == 'artist_id'
+
+    def test_filter_without_index(self):
+        songs = self.Song.filter(title='Foo')
+        assert songs.explain() == {'index': None, 'keys': None, 'filter': {'title': 'Foo'},
+                                   'query': str(self.table.filter({'title': 'Foo'}))}
+
+    def test_all(self):
+        assert self.Song.all().explain()['index'] is None
+
+    def test_with_options_keeps_plan(self):
+        songs = self.Song.filter(artist_id=1).with_options(read_mode='outdated')
+        assert songs.explain()['index'] == 'artist_id'
+
+
+class SliceTests(BaseTestCase):
+    def setUp(self):
+        super(SliceTests, self).setUp()
+        self.pool = pools.register('recording', RecordingPool([{'id': 1}]))
+
+        class Artist(Model):
+            pool = 'recording'
+        self.Artist = Artist
+        self.table = r.table('artists')
+
+    def tearDown(self):
+        super(SliceTests, self).tearDown()
+        pools.unregister('recording')
+
+    def test_slice_is_lazy(self):
+        artists = self.Artist.all()[10:30]
+        assert isinstance(artists, ObjectSet)
+        assert self.pool.queries == []
+        assert str(artists.query) == str(self.table.skip(10).limit(20))
+
+    def test_slice_without_start(self):
+        assert str(self.Artist.all()[:20].query) == str(self.table.limit(20))
+
+    def test_slice_without_stop(self):
+        assert str(self.Artist.all()[10:].query) == str(self.table.skip(10))
+
+    def test_empty_slice(self):
+        assert str(self.Artist.all()[5:2].query) == str(self.table.skip(5).limit(0))
+
+    def test_chained_slices(self):
+        artists = self.Artist.all()[10:30][5:]
+        assert str(artists.query) == str(self.table.skip(10).limit(20).skip(5))
+
+    def test_slice_keeps_options(self):
+        artists = self.Artist.all().with_options(read_mode='outdated')[:1]
+        list(artists)
+        assert self.pool.queries == [(str(self.table.limit(1)), {'read_mode': 'outdated'})]
+
+    def test_index(self):
+        self.pool.result = {'id': 1}
+        assert self.Artist.all()[3]['id'] == 1
+        assert self.pool.queries == [(str(self.table.nth(3)), {})]
+
+    def test_index_out_of_range(self):
+        def run(query, **optargs):
+            raise ReqlNonExistenceError('Index out of bounds: 3', None, [])
+        self.pool.run = run
+        with pytest.raises(IndexError):
+            self.Artist.all()[3]
+
+    def test_negative_index_fetches(self):
+        self.pool.result = [{'id': 1}, {'id': 2}, {'id': 3}]
+        assert self.Artist.all()[-2]['id'] == 2
+        assert self.pool.queries == [(str(self.table), {})]
+
+    def test_step_fetches(self):
+        self.pool.result = [{'id': 1}, {'id': 2}, {'id': 3}]
+        assert [a['id'] for a in self.Artist.all()[::2]] == [1, 3]
+        assert self.pool.queries == [(str(self.table), {})]
+
+    def test_fetched_set_uses_cache(self):
+        artists = self.Artist.all()
+        list(artists)
+        assert artists[0]['id'] == 1
+        assert artists[:1][0]['id'] == 1
+        assert len(self.pool.queries) == 1
+
+
+class ServerCountTests(BaseTestCase):
+    def setUp(self):
+        super(ServerCountTests, self).setUp()
+        self.pool = pools.register('recording', RecordingPool(3))
+
+        class Artist(Model):
+            pool = 'recording'
+        self.Artist = Artist
+        self.table = r.table('artists')
+
+    def tearDown(self):
+        super(ServerCountTests, self).tearDown()
+        pools.unregister('recording')
+
+    def test_len(self):
+        assert len(self.Artist.filter(genre='rock')) == 3
+        assert self.pool.queries == [(str(self.table.filter({'genre': 'rock'}).count()), {})]
+
+    def test_count(self):
+        assert self.Artist.all()[:2].count() == 3
+        assert self.pool.queries == [(str(self.table.limit(2).count()), {})]
+
+    def test_exists(self):
+        self.pool.result = False
+        assert self.Artist.all().exists() is True
+        assert self.pool.queries == [(str(self.table.is_empty()), {})]
+
+    def test_not_exists(self):
+        self.pool.result = True
+        assert self.Artist.all().exists() is False
+
+    def test_fetched_set_uses_cache(self):
+        self.pool.result = [{'id': 1}, {'id': 2}]
+        artists = self.Artist.all()
+        list(artists)
+        assert len(artists) == 2
+        assert artists.count() == 2
+        assert artists.exists() is True
+        assert len(self.pool.queries) == 1
+
+    def test_list_runs_a_single_query(self):
+        self.pool.result = [{'id': 1}]
+        assert len(list(self.Artist.all())) == 1
+        assert self.pool.queries == [(str(self.table), {})]
+
+    def test_bool(self):
+        self.pool.result = False
+        assert self.Artist.all()
+        assert self.pool.queries == [(str(self.table.is_empty()), {})]
+
+    def test_fetched_set_bool_uses_cache(self):
+        self.pool.result = []
+        artists = self.Artist.all()
+        list(artists)
+        assert not artists
+        assert len(self.pool.queries) == 1
+
+
+class ProjectionTests(BaseTestCase):
+    def setUp(self):
+        super(ProjectionTests, self).setUp()
+        self.pool = pools.register('recording', RecordingPool([{'id': 1, 'name': 'Andrei'}]))
+
+        class Artist(Model):
+            pool = 'recording'
+        self.Artist = Artist
+        self.table = r.table('artists')
+
+    def tearDown(self):
+        super(ProjectionTests, self).tearDown()
+        pools.unregister('recording')
+
+    def test_only(self):
+        artist = list(self.Artist.all().only('name'))[0]
+        assert self.pool.queries == [(str(self.table.pluck('id', 'name')), {})]
+        assert artist['name'] == 'Andrei'
+        with pytest.raises(KeyError):
+            artist['bio']
+
+    def test_defer(self):
+        artist = list(self.Artist.filter(name='Andrei').defer('bio'))[0]
+        assert self.pool.queries == [
+            (str(self.table.filter({'name': 'Andrei'}).without('bio')), {})]
+        assert artist['name'] == 'Andrei'
+        with pytest.raises(AttributeError) as excinfo:
+            artist.fields.bio
+        assert 'deferred' in str(excinfo.value)
+
+    def test_defer_id(self):
+        with pytest.raises(ValueError):
+            self.Artist.all().defer('id')
+
+    def test_chained(self):
+        artists = self.Artist.all().only('name', 'bio').defer('bio').only('name')
+        assert artists.only_fields == frozenset(['id', 'name'])
+        assert artists.deferred_fields == frozenset(['bio'])
+
+    def test_kept_by_copies(self):
+        artists = self.Artist.all().only('name').with_options(read_mode='outdated')[:5]
+        assert artists.only_fields == frozenset(['id', 'name'])
+
+    def test_index(self):
+        self.pool.result = {'id': 1}
+        artist = self.Artist.all().defer('bio')[0]
+        assert artist.fields.is_deferred('bio')
+
+    def test_full_models(self):
+        artist = list(self.Artist.all())[0]
+        assert not artist.fields.is_deferred('bio')
+        assert artist.get('bio') is None
+
+
+class ValuesTests(BaseTestCase):
+    def setUp(self):
+        super(ValuesTests, self).setUp()
+        self.pool = pools.register('recording', RecordingPool(
+            [{'id': 1, 'name': 'Andrei', 'country': 'Romania'}, {'id': 2, 'name': 'Bob'}]))
+
+        class Artist(Model):
+            pool = 'recording'
+        self.Artist = Artist
+        self.table = r.table('artists')
+
+    def tearDown(self):
+        super(ValuesTests, self).tearDown()
+        pools.unregister('recording')
+
+    def test_values(self):
+        assert list(self.Artist.all().values()) == self.pool.result
+        assert self.pool.queries == [(str(self.table), {})]
+
+    def test_values_with_fields(self):
+        list(self.Artist.filter(name='Bob').values('name', 'country'))
+        assert self.pool.queries == [
+            (str(self.table.filter({'name': 'Bob'}).pluck('name', 'country')), {})]
+
+    def test_values_list(self):
+        rows = list(self.Artist.all().values_list('name', 'country'))
+        assert rows == [('Andrei', 'Romania'), ('Bob', None)]
+        assert self.pool.queries == [(str(self.table.pluck('name', 'country')), {})]
+
+    def test_values_list_flat(self):
+        assert list(self.Artist.all().values_list('name', flat=True)) == ['Andrei', 'Bob']
+
+    def test_values_list_invalid(self):
+        with pytest.raises(TypeError):
+            self.Artist.all().values_list()
+        with pytest.raises(TypeError):
+            self.Artist.all().values_list('name', 'country', flat=True)
+        with pytest.raises(TypeError):
+            self.Artist.all().values_list('name', flatten=True)
+
+    def test_index(self):
+        self.pool.result = {'name': 'Andrei'}
+        assert self.Artist.all().values_list('name', flat=True)[0] == 'Andrei'
+        assert self.pool.queries == [(str(self.table.pluck('name').nth(0)), {})]
+
+    def test_does_not_change_original(self):
+        artists = self.Artist.all()
+        artists.values('name')
+        assert artists.row_factory is None
+        assert str(artists.query) == str(self.table)
+        assert list(artists)[0]['name'] == 'Andrei'
+
+
+class BulkCreateQueryTests(BaseTestCase):
+    def setUp(self):
+        super(BulkCreateQueryTests, self).setUp()
+        self.pool = pools.register('recording', RecordingPool(None))
+
+        class Artist(Model):
+            pool = 'recording'
+        self.Artist = Artist
+
+    def tearDown(self):
+        super(BulkCreateQueryTests, self).tearDown()
+        pools.unregister('recording')
+
+    def test_batches(self):
+        results = [{'errors': 0, 'generated_keys': ['a', 'b']},
+                   {'errors': 0, 'generated_keys': ['c']}]
+        self.pool.run = lambda query, **optargs: (self.pool.queries.append(str(query)) or
+                                                  results.pop(0))
+        artists = [self.Artist(name=name) for name in ('x', 'y', 'z')]
+        self.Artist.bulk_create(artists, batch_size=2)
+        assert self.pool.queries == [
+            str(r.table('artists').insert([{'name': 'x'}, {'name': 'y'}])),
+            str(r.table('artists').insert([{'name': 'z'}]))]
+        assert [a['id'] for a in artists] == ['a', 'b', 'c']
+
+    def test_ids_assigned_in_order(self):
+        self.pool.result = {'errors': 0, 'generated_keys': ['a']}
+        artists = self.Artist.bulk_create([self.Artist(id='x'), self.Artist()])
+        assert [a['id'] for a in artists] == ['x', 'a']
+
+    def test_nothing_to_create(self):
+        assert self.Artist.bulk_create([]) == []
+        assert self.pool.queries == []
+
+    def test_other_models(self):
+        class Song(Model):
+            pass
+
+        with pytest.raises(ValueError):
+            self.Artist.bulk_create([Song()])
+
+
+class SetUpdateTests(BaseTestCase):
+    def setUp(self):
+        super(SetUpdateTests, self).setUp()
+        self.pool = pools.register('recording', RecordingPool(
+            {'errors': 0, 'replaced': 3, 'deleted': 2}))
+
+        class Artist(Model):
+            pool = 'recording'
+            belongs_to = ('Label',)
+        self.Artist = Artist
+        self.table = r.table('artists')
+
+    def tearDown(self):
+        super(SetUpdateTests, self).tearDown()
+        pools.unregister('recording')
+
+    def test_update(self):
+        assert self.Artist.filter(country='Romania').update(active=False) == 3
+        assert self.pool.queries == [
+            (str(self.table.filter({'country': 'Romania'}).update({'active': False})), {})]
+
+    def test_update_with_expressions(self):
+        self.Artist.all().update(plays=F('plays') + 1, active=True)
+        # r.row is turned into a function, whose variable is numbered
+        query = str(self.table.update({'plays': r.row['plays'] + 1, 'active': True}))
+        assert (re.sub(r'var_\d+', 'var', self.pool.queries[0][0]) ==
+                re.sub(r'var_\d+', 'var', query))
+
+    def test_delete(self):
+        assert self.Artist.all()[:2].delete() == 2
+        assert self.pool.queries == [(str(self.table.limit(2).delete()), {})]
+
+    def test_projected_update(self):
+        self.Artist.filter(country='Romania').only('name')[:2].update(active=False)
+        assert self.pool.queries == [
+            (str(self.table.filter({'country': 'Romania'}).limit(2)
+                 .update({'active': False})), {})]
+
+    def test_projected_delete(self):
+        self.Artist.all().defer('bio').delete()
+        self.Artist.all().values_list('name', flat=True).delete()
+        assert self.pool.queries == [(str(self.table.delete()), {})] * 2
+
+    def test_error(self):
+        self.pool.result = {'errors': 1, 'first_error': 'Oops'}
+        with pytest.raises(OperationError):
+            self.Artist.all().update(active=False)
+        with pytest.raises(OperationError):
+            self.Artist.all().delete()
+
+    def test_restricted_field(self):
+        with pytest.raises(AttributeError):
+            self.Artist.all().update(label_id=1)
+        assert self.pool.queries == []
+
+    def test_cache_cleared(self):
+        artists = self.Artist.all()
+        artists.result_cache = []
+        artists.update(active=False)
+        assert artists.result_cache is None
+
+
 class LenTests(DbBaseTestCase):
     def setUp(self):
         super(LenTests, self).setUp()
@@ -314,6 +898,11 @@ class LenTests(DbBaseTestCase):
         a.delete()
         assert len(self.Artist.all()) == 1
 
+    def test_exists(self):
+        assert self.Artist.all().exists() is False
+        self.Artist.create()
+        assert self.Artist.all().exists() is True
+
 
 class GetItemTests(DbBaseTestCase):
     def setUp(self):
@@ -345,7 +934,22 @@ class GetItemTests(DbBaseTestCase):
         with pytest.raises(IndexError):
             self.Artist.all()[1]
 
-    # TODO: Write tests for negative indices, slices
+    def test_negative_index(self):
+        a = self.Artist.create()
+        assert self.Artist.all()[-1]['id'] == a['id']
+
+    def test_negative_index_below_last(self):
+        a, b = self.Artist.create(), self.Artist.create()
+        assert self.Artist.all()[-2]['id'] in (a['id'], b['id'])
+
+    def test_slice(self):
+        for _ in range(3):
+            self.Artist.create()
+        artists = self.Artist.all()[1:]
+        assert isinstance(artists, ObjectSet)
+        assert len(list(artists)) == 2
+        assert len(list(self.Artist.all()[:2])) == 2
+        assert len(list(self.Artist.all()[5:])) == 0
 
 
 class CustomQueryTests(DbBaseTestCase):
@@ -0,0 +1,75 @@
+from rethinkdb import r
+
+from remodel.models import Model
+from remodel.planner import Plan, index_fields, index_name, plan
+
+from . import BaseTestCase
+
+
+class IndexNameTests(BaseTestCase):
+    def test_simple(self):
+        assert index_fields('email') == ('email',)
+        assert index_name('email') == 'email'
+
+    def test_compound(self):
+        assert index_fields(('last_name', 'first_name')) == ('last_name', 'first_name')
+        assert index_name(('last_name', 'first_name')) == 'last_name_first_name'
+
+
+class PlanTests(BaseTestCase):
+    def setUp(self):
+        super(PlanTests, self).setUp()
+
+        class Person(Model):
+            indexes = ('email', 'last_name', ('last_name', 'first_name'))
+        self.Person = Person
+        self.table = r.table('people')
+
+    def test_no_index(self):
+        query_plan = plan(self.Person, self.table, {'age': 30})
+        assert query_plan.explain() == {'index': None, 'keys': None,
+                                        'filter': {'age': 30}}
+        assert str(query_plan.apply(self.table)) == str(self.table.filter({'age': 30}))
+
+    def test_no_predicates(self):
+        query_plan = plan(self.Person, self.table, {})
+        assert query_plan.apply(self.table) is self.table
+
+    def test_simple_index(self):
+        query_plan = plan(self.Person, self.table, {'email': 'a@b.c', 'age': 30})
+        assert query_plan.explain() == {'index': 'email', 'keys': ['a@b.c'],
+                                        'filter': {'age': 30}}
+        assert (str(query_plan.apply(self.table)) ==
+                str(self.table.get_all('a@b.c', index='email').filter({'age': 30})))
+
+    def test_compound_index_preferred(self):
+        query_plan = plan(self.Person, self.table,
+                          {'last_name': 'Doe', 'first_name': 'John'})
+        assert query_plan.explain() == {'index': 'last_name_first_name',
+                                        'keys': [['Doe', 'John']], 'filter': {}}
+        assert (str(query_plan.apply(self.table)) ==
+                str(self.table.get_all(['Doe', 'John'], index='last_name_first_name')))
+
+    def test_partially_covered_compound_index(self):
+        query_plan = plan(self.Person, self.table, {'first_name': 'John'})
+        assert query_plan.index is None
+
+    def test_primary_key_preferred(self):
+        query_plan = plan(self.Person, self.table, {'id': 1, 'email': 'a@b.c'})
+        assert query_plan.explain() == {'index': 'id', 'keys': [1],
+                                        'filter': {'email': 'a@b.c'}}
+
+    def test_unindexable_values(self):
+        query_plan = plan(self.Person, self.table,
+                          {'email': None, 'last_name': {'prefix': 'D'}})
+        assert query_plan.index is None
+
+    def test_selection_applied(self):
+        query = self.table.get_all(1, index='team_id')
+        query_plan = plan(self.Person, query, {'email': 'a@b.c'})
+        assert query_plan.explain()['index'] is None
+
+    def test_many_keys(self):
+        query_plan = Plan('id', [1, 2])
+        assert (str(query_plan.apply(self.table)) ==
+                str(self.table.get_all(r.args([1, 2]), index='id')))
@@ -80,6 +80,17 @@ class IndexRegistryTests(BaseTestCase):
         assert 'Artist' in self.ir._data
         assert self.ir._data['Artist'] == set(['person_id'])
 
+    def test_register_colliding_name(self):
+        self.ir.register('Artist', 'last_name')
+        with pytest.raises(ValueError):
+            self.ir.register('Artist', ('last', 'name'))
+        assert self.ir._data['Artist'] == set(['last_name'])
+
+    def test_register_colliding_name_other_model(self):
+        self.ir.register('Artist', 'last_name')
+        self.ir.register('Person', ('last', 'name'))
+        assert self.ir._data['Person'] == set([('last', 'name')])
+
     def test_unregister(self):
         self.ir.register('Artist', 'person_id')
         self.ir.unregister('Artist', 'person_id')
@@ -1,12 +1,13 @@
 import pytest
 
-from remodel.connection import get_conn
+from remodel.connection import get_conn, pools
 from remodel.helpers import create_tables, create_indexes
 from remodel.models import Model
+from remodel.registry import model_registry
 from remodel.related import (HasOneDescriptor, BelongsToDescriptor,
                              HasManyDescriptor, HasAndBelongsToManyDescriptor)
 
-from . import BaseTestCase, DbBaseTestCase
+from . import BaseTestCase, DbBaseTestCase, RecordingPool
 
 # TODO: Ensure models are saved/retrieved correctly by performing direct queries
 
@@ -965,3 +966,39 @@ class RelatedM2MSetTests(DbBaseTestCase):
             results = list(a['tastes'].order_by('name').run(conn))
         assert results[0]['name'] == 'Classical'
         assert results[1]['name'] == 'House'
+
+
+class RelatedM2MRunOptionsTests(BaseTestCase):
+    def setUp(self):
+        super(RelatedM2MRunOptionsTests, self).setUp()
+        self.pool = pools.register('recording', RecordingPool([]))
+
+        class Artist(Model):
+            pool = 'recording'
+            has_and_belongs_to_many = ('Song',)
+
+        class Song(Model):
+            pool = 'recording'
+            run_options = {'durability': 'soft'}
+        model_registry.get('_ArtistSong').pool = 'recording'
+        self.artist = Artist.objects._wrap({'id': 1})
+        self.song = Song.objects._wrap({'id': 2})
+
+    def tearDown(self):
+        super(RelatedM2MRunOptionsTests, self).tearDown()
+        pools.unregister('recording')
+
+    def test_add(self):
+        self.artist['songs'].add(self.song)
+        assert len(self.pool.queries) == 2
+        assert all(optargs == {'durability': 'soft'} for _, optargs in self.pool.queries)
+
+    def test_remove(self):
+        self.pool.result = [{'id': 2}]
+        self.artist['songs'].remove(self.song)
+        assert len(self.pool.queries) == 2
+        assert all(optargs == {'durability': 'soft'} for _, optargs in self.pool.queries)
+
+    def test_clear(self):
+        self.artist['songs'].clear()
+        assert self.pool.queries[0][1] == {'durability': 'soft'}